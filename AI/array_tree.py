@@ -0,0 +1,282 @@
+from chess_node import *
+from naive_bot import NaiveBot
+from rollout import Rollout
+from uct import uct_select
+
+import os
+import traceback
+from pathlib import Path
+
+import numpy as np
+
+
+default_save_dir = Path(os.path.realpath(os.path.dirname(__file__))).absolute().joinpath('model')
+
+# index used for "no node" in the parent / child / sibling arrays
+NO_NODE = -1
+
+# per-node arrays and their types, every node takes one slot in each
+FIELDS = (
+    ('parent', np.int32),
+    ('first_child', np.int32),
+    ('next_sibling', np.int32),
+    ('move_code', np.uint16),
+    ('white_wins', np.uint32),
+    ('black_wins', np.uint32),
+    ('draws', np.uint32),
+    ('state', np.int8),
+)
+
+
+def encode_move(chessMove : tuple):
+    """ Packs a (from, to[, promo]) move as from | to << 6 | promo << 12
+    """
+    code = chessMove[0] | (chessMove[1] << 6)
+    if len(chessMove) == 3:
+        code |= chessMove[2] << 12
+    return code
+
+def decode_move(code : int):
+    code = int(code)
+    if code >> 12:
+        return (code & 63, (code >> 6) & 63, code >> 12)
+    return (code & 63, (code >> 6) & 63)
+
+
+class ArrayTree():
+    """ MCTS tree stored as parallel numpy arrays indexed by node number, with one board that follows the current node
+
+    Nodes hold no position, checkout and reset_current play and take back moves on self.position instead.
+    """
+
+    def __init__(self, import_tree_file : str = None, save_dir=None, capacity : int = 1024, use_bitboard : bool = False):
+
+        if save_dir is None:
+            self.save_dir = default_save_dir
+        else:
+            self.save_dir = save_dir
+
+        if import_tree_file is not None:
+            with np.load(import_tree_file) as data:
+                self.size = int(data['size'])
+                for name, dtype in FIELDS:
+                    setattr(self, name, data[name].astype(dtype))
+                self.root_position = ChessNode(import_board=data['root_board'].tobytes(), use_bitboard=use_bitboard, side_to_move=int(data['root_move']))
+        else:
+            self.size = 0
+            for name, dtype in FIELDS:
+                setattr(self, name, np.zeros(capacity, dtype=dtype))
+            self.root_position = ChessNode(use_bitboard=use_bitboard)
+            self.new_node(NO_NODE, 0)
+
+        self.root = 0
+        self.position = self.root_position.copy()
+        self.current = self.root
+        self.game_path = []
+        self.undo_moves = []
+
+    def grow(self):
+        """ Doubles the capacity of every node array
+        """
+        for name, dtype in FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(len(old) * 2, dtype=dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def new_node(self, parent : int, move_code : int):
+        if self.size == len(self.parent):
+            self.grow()
+
+        node = self.size
+        self.size += 1
+
+        self.parent[node] = parent
+        self.first_child[node] = NO_NODE
+        self.move_code[node] = move_code
+        self.white_wins[node] = self.black_wins[node] = self.draws[node] = 0
+        self.state[node] = StateEvaluation.PLAY.value
+
+        # new children go to the front of the parent's sibling list
+        if parent != NO_NODE:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        else:
+            self.next_sibling[node] = NO_NODE
+
+        return node
+
+    def children(self, node : int):
+        """ Child node indices, newest first
+        """
+        child_nodes = []
+        child = int(self.first_child[node])
+        while child != NO_NODE:
+            child_nodes.append(child)
+            child = int(self.next_sibling[child])
+        return child_nodes
+
+    def child_map(self, node : int):
+        """ Packed move code -> child node index
+        """
+        child_nodes = self.children(node)
+        return dict(zip(self.move_code[child_nodes].tolist(), child_nodes))
+
+    def get_child(self, node : int, chessMove : tuple):
+        code = encode_move(chessMove)
+        child = int(self.first_child[node])
+        while child != NO_NODE:
+            if self.move_code[child] == code:
+                return child
+            child = int(self.next_sibling[child])
+        return NO_NODE
+
+    def stats(self, node : int):
+        return (int(self.white_wins[node]), int(self.black_wins[node]), int(self.draws[node]))
+
+    def visits(self, node : int):
+        return int(self.white_wins[node]) + int(self.black_wins[node]) + int(self.draws[node])
+
+    def backpropogate_results(self, node : int, result_append_index : int):
+        counts = (self.white_wins, self.black_wins, self.draws)[result_append_index]
+        while node != NO_NODE:
+            counts[node] += 1
+            node = int(self.parent[node])
+
+    def reset_current(self):
+        while len(self.undo_moves) > 0:
+            self.position.unmake_move(self.undo_moves.pop())
+
+        self.current = self.root
+        self.game_path = []
+
+    def checkout(self, chessMove : tuple, add_if_not_exists : bool = False):
+
+        if type(chessMove[0]) is not int:
+            chessMove = (self.position.square_to_board_index(chessMove[0]), self.position.square_to_board_index(chessMove[1]))
+
+        child = self.get_child(self.current, chessMove)
+        is_new = False
+
+        if child == NO_NODE:
+            if not add_if_not_exists:
+                raise Exception("Child from move {} is not defined.".format(chessMove))
+            child = self.new_node(self.current, encode_move(chessMove))
+            is_new = True
+
+        self.undo_moves.append(self.position.make_move(chessMove))
+        self.game_path.append(chessMove)
+        self.current = child
+
+        if is_new:
+            # same draw rules, and draw tally, as ChessNode.create_child
+            self.state[child] = self.position.state_evaluation
+            if self.position.state_evaluation == StateEvaluation.DRAW.value:
+                self.backpropogate_results(child, 2)
+        else:
+            self.position.state_evaluation = int(self.state[child])
+
+    def define_state(self):
+        """ Legal moves at the current node, scoring (and counting) checkmate or stalemate the first time it is found
+        """
+        if self.state[self.current] != StateEvaluation.PLAY.value:
+            return [], int(self.state[self.current])
+
+        moves, in_check = self.position.generate_legal_moves(self.position.move)
+
+        if len(moves) == 0:
+            self.state[self.current] = StateEvaluation.CHECKMATE.value if in_check else StateEvaluation.STALEMATE.value
+            self.position.state_evaluation = int(self.state[self.current])
+            self.backpropogate_results(self.current, self.position.get_result_index())
+
+        return moves, int(self.state[self.current])
+
+    def monte_carlo_tree_search(self, new_game=True):
+        """ One search iteration, the same selection, expansion, simulation and backpropagation steps as mcts
+        """
+        if new_game:
+            self.reset_current()
+
+        policy = NaiveBot.suggest_move_in_place
+        iteration_visits = self.visits(self.root)
+
+        # * Step 1. Selection
+        while self.first_child[self.current] != NO_NODE:
+            moves, state = self.define_state()
+            child_nodes = self.child_map(self.current)
+            codes = [encode_move(move) for move in moves]
+
+            # moves that have not been checked have infinite potential, let the policy choose among them
+            unexplored_moves = [move for move, code in zip(moves, codes) if code not in child_nodes]
+
+            if len(unexplored_moves) == 0:
+                nodes = np.array([child_nodes[code] for code in codes])
+                visits = self.white_wins[nodes].astype(np.int64) + self.black_wins[nodes] + self.draws[nodes]
+                unexplored_moves = [moves[index] for index in np.flatnonzero(visits == 0)]
+
+            if len(unexplored_moves) > 1:
+                suggested_move = policy(self.position, unexplored_moves)
+            elif len(unexplored_moves) == 1:
+                suggested_move = unexplored_moves[0]
+            else:
+                # scored for the side to move at the child, as in mcts
+                wins = self.white_wins[nodes] if self.position.move == Turn.Black.value else self.black_wins[nodes]
+                suggested_move = moves[uct_select(wins, self.draws[nodes], visits, self.visits(self.current))]
+
+            self.checkout(suggested_move, add_if_not_exists=True)
+
+        #* Step 2. Expansion
+        moves, state = self.define_state()
+
+        if state != StateEvaluation.PLAY.value:
+            # selection ended on a game that is already over, count its result again
+            if self.visits(self.root) == iteration_visits:
+                self.backpropogate_results(self.current, self.position.get_result_index())
+            return
+
+        self.checkout(policy(self.position, moves), add_if_not_exists=True)
+        new_leaf_node = self.current
+
+        #* Step 3. Simulation
+        moves, state = self.define_state()
+
+        if state == StateEvaluation.PLAY.value:
+            rollout = Rollout(self.position, random_move_odds=4)
+            try:
+                result = rollout.play()
+            except Exception:
+                print("Failure to simulate with Naive Bot")
+                traceback.print_exc()
+                quit()
+
+            #* Step 4. Backpropagation
+            self.backpropogate_results(new_leaf_node, result)
+
+    def nbytes(self):
+        """ Bytes used by the node arrays (allocated capacity, not just the nodes in use)
+        """
+        return sum(getattr(self, name).nbytes for name, _ in FIELDS)
+
+    def save_tree(self, tree_name : str = 'array_tree.npz'):
+        """ Writes the used part of every node array in one np.savez call
+        """
+        if not self.save_dir.exists():
+            self.save_dir.mkdir()
+
+        arrays = {name: getattr(self, name)[:self.size] for name, _ in FIELDS}
+        np.savez(str(self.save_dir.joinpath(tree_name)), size=self.size, root_board=np.frombuffer(bytes(self.root_position.board), dtype=np.uint8),
+                 root_move=self.root_position.move, **arrays)
+
+
+if __name__ == '__main__':
+    import time
+
+    tree = ArrayTree()
+
+    start = time.time()
+    for _ in range(100):
+        tree.monte_carlo_tree_search(new_game=True)
+
+    print("Root states:", tree.stats(tree.root))
+    print("Nodes: {}  ({:.1f} s)".format(tree.size, time.time() - start))
+    print("Bytes per node: {}".format(sum(np.dtype(dtype).itemsize for _, dtype in FIELDS)))
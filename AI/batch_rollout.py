@@ -0,0 +1,442 @@
+from chess_node import *
+import geometry
+
+import numpy as np
+
+
+#* square sets are uint64 arrays, one entry per board, where bit i is board index i (0 is a8, 63 is h1)
+#* moves are generated for white only: boards with black to move are mirrored top to bottom with the colors swapped
+
+WHITE = Turn.White.value
+BLACK = Turn.Black.value
+
+FULL = np.uint64((1 << 64) - 1)
+ZERO = np.uint64(0)
+
+def _columns(*cols):
+    mask = 0
+    for col in cols:
+        for row in range(8):
+            mask |= 1 << (row * 8 + col)
+    return np.uint64(mask)
+
+# squares a one step shift may land on, by column step (a shift across the left or right edge wraps to the other side)
+WRAP = {0: FULL, 1: ~_columns(0), -1: ~_columns(7), 2: ~_columns(0, 1), -2: ~_columns(6, 7)}
+
+ROW_0 = np.uint64(0xFF)             # white pawns promote here
+ROW_6 = np.uint64(0xFF << 48)       # white pawns start here
+
+# directions in the order the sliders are generated, rook directions first
+SLIDE_OFFSETS = (-1, 1, -8, 8, -9, -7, 7, 9)
+LINE_OFFSETS = SLIDE_OFFSETS[:4]
+
+COL_STEPS = {offset: col_step for offset, (_, col_step) in geometry.DIRECTION_STEPS.items()}
+KNIGHT_OFFSETS = tuple(row * 8 + col for row, col in geometry.KNIGHT_STEPS)
+COL_STEPS.update({row * 8 + col: col for row, col in geometry.KNIGHT_STEPS})
+COL_STEPS.update({-8: 0, -16: 0})
+
+# move groups: the targets of every group are one square set, origins are the target minus the group offset
+# (sliders walk back to the piece instead). Pawn moves onto the last row have groups of their own, one per promotion.
+SLIDE_GROUPS = range(0, 8)
+KNIGHT_GROUPS = range(8, 16)
+KING_GROUPS = range(16, 24)
+PUSH, DOUBLE_PUSH, CAPTURE_RIGHT, CAPTURE_LEFT = 24, 25, 26, 27
+PROMOTION_GROUPS = (28, 29, 30)     # push, capture right, capture left onto the last row
+GROUP_COUNT = 31
+
+GROUP_OFFSETS = np.array(SLIDE_OFFSETS + KNIGHT_OFFSETS + geometry.KING_DIRECTIONS + (-8, -16, -7, -9, -8, -7, -9), dtype=np.int64)
+GROUP_WEIGHTS = np.array([1] * 28 + [4] * 3, dtype=np.int64)
+
+# white promotion pieces in the order they are listed, black ones are 6 higher
+PROMOTIONS = np.array([PieceType.WQ.value, PieceType.WR.value, PieceType.WB.value, PieceType.WN.value], dtype=np.int8)
+
+MIRROR = np.arange(64) ^ 56
+SWAP_COLORS = np.array([0] + list(range(7, 13)) + list(range(1, 7)), dtype=np.int8)
+VALUES = np.array(PIECE_VALUES, dtype=np.int16)
+
+
+def _build_move_ranks():
+    """ MOVE_RANKS[piece][from][to]: position of the move among the piece's moves in the order ChessNode lists them
+    """
+    ranks = np.zeros((13, 64, 64), dtype=np.int16)
+    line_rays = lambda square, offsets: [target for offset in offsets for target in geometry.RAYS[offset][square]]
+
+    for square in range(64):
+        orders = {
+            PieceType.WK.value: geometry.KING_TARGETS[square],
+            PieceType.WQ.value: line_rays(square, geometry.ROOK_DIRECTIONS) + line_rays(square, geometry.BISHOP_DIRECTIONS),
+            PieceType.WR.value: line_rays(square, geometry.ROOK_DIRECTIONS),
+            PieceType.WB.value: line_rays(square, geometry.BISHOP_DIRECTIONS),
+            PieceType.WN.value: geometry.KNIGHT_TARGETS[square],
+            PieceType.WP.value: geometry.PAWN_PUSHES[WHITE][square] + geometry.PAWN_CAPTURES[WHITE][square],
+        }
+        for piece, targets in orders.items():
+            for rank, target in enumerate(targets):
+                ranks[piece][square][target] = rank
+                if piece != PieceType.WP.value:
+                    ranks[piece + 6][square][target] = rank
+
+        for rank, target in enumerate(geometry.PAWN_PUSHES[BLACK][square] + geometry.PAWN_CAPTURES[BLACK][square]):
+            ranks[PieceType.BP.value][square][target] = rank
+    return ranks
+
+MOVE_RANKS = _build_move_ranks()
+
+
+def shift(squares, offset : int):
+    if offset > 0:
+        return squares << np.uint64(offset)
+    return squares >> np.uint64(-offset)
+
+def step(squares, offset : int):
+    """ Moves every square one step by offset, dropping the ones that would leave the board
+    """
+    return shift(squares, offset) & WRAP[COL_STEPS[offset]]
+
+def slide_attacks(sliders, empty, offset : int):
+    """ Squares reached from every slider along one direction, up to and including the first blocker (Kogge-Stone fill)
+    """
+    empty = empty & WRAP[COL_STEPS[offset]]
+    sliders = sliders | (empty & shift(sliders, offset))
+    empty = empty & shift(empty, offset)
+    sliders = sliders | (empty & shift(sliders, 2 * offset))
+    empty = empty & shift(empty, 2 * offset)
+    sliders = sliders | (empty & shift(sliders, 4 * offset))
+    return step(sliders, offset)
+
+def relative_boards(boards, sides):
+    """ Copies of the boards with the side to move as white
+    """
+    relative = boards.copy()
+    black = sides == BLACK
+    relative[black] = SWAP_COLORS[boards[black][:, MIRROR]]
+    return relative
+
+def piece_sets(boards):
+    """ Square set of every piece type, indexed [piece][board]
+    """
+    one_hot = boards[:, None, :] == np.arange(13, dtype=np.int8)[None, :, None]
+    return np.ascontiguousarray(np.packbits(one_hot, axis=2, bitorder='little').view('<u8')[:, :, 0].T)
+
+
+def generate_move_sets(boards):
+    """ Target square sets of every move group for white to move on each board, with the same rules as ChessNode
+    (no castling or en passant, pinned pieces do not move)
+
+    Returns the (boards, GROUP_COUNT) target sets and whether each side to move is in check.
+    """
+    pieces = piece_sets(boards)
+    own = pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5] | pieces[6]
+    enemy = pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11] | pieces[12]
+    occupied = own | enemy
+    empty = ~occupied
+    king = pieces[PieceType.WK.value]
+
+    enemy_lines = pieces[PieceType.BQ.value] | pieces[PieceType.BR.value]
+    enemy_diagonals = pieces[PieceType.BQ.value] | pieces[PieceType.BB.value]
+
+    #* squares the enemy attacks, looking through the king so it cannot step back along a line
+    without_king = empty | king
+    attacked = step(pieces[PieceType.BP.value], 7) | step(pieces[PieceType.BP.value], 9)
+    for offset in KNIGHT_OFFSETS:
+        attacked |= step(pieces[PieceType.BN.value], offset)
+    for offset in geometry.KING_DIRECTIONS:
+        attacked |= step(pieces[PieceType.BK.value], offset)
+    for offset in SLIDE_OFFSETS:
+        attacked |= slide_attacks(enemy_lines if offset in LINE_OFFSETS else enemy_diagonals, without_king, offset)
+
+    #* checks and pins, walking out from the king
+    checkers = (step(king, -7) | step(king, -9)) & pieces[PieceType.BP.value]
+    for offset in KNIGHT_OFFSETS:
+        checkers |= step(king, offset) & pieces[PieceType.BN.value]
+
+    check_lines = np.zeros_like(king)
+    pinned = np.zeros_like(king)
+    for offset in SLIDE_OFFSETS:
+        attackers = enemy_lines if offset in LINE_OFFSETS else enemy_diagonals
+        ray = slide_attacks(king, empty, offset)
+        first = ray & occupied
+        checking = (first & attackers) != 0
+        checkers |= first & attackers
+        check_lines |= np.where(checking, ray, ZERO)
+
+        shield = first & own
+        second = slide_attacks(shield, empty, offset) & occupied
+        pinned |= np.where((second & attackers) != 0, shield, ZERO)
+
+    in_check = checkers != 0
+    double_check = np.bitwise_count(checkers) > 1
+    check_mask = np.where(in_check, check_lines | checkers, FULL)
+
+    targets = np.zeros((len(boards), GROUP_COUNT), dtype=np.uint64)
+
+    #* king moves
+    for group, offset in zip(KING_GROUPS, geometry.KING_DIRECTIONS):
+        targets[:, group] = step(king, offset) & ~own & ~attacked
+
+    # if double check, only king moves
+    movers = np.where(double_check, ZERO, own & ~pinned & ~king)
+    allowed = check_mask & ~own
+
+    # while in check, sliders only stop on friendly pieces and the checking piece
+    slider_empty = ~np.where(in_check, own | checkers, occupied)
+
+    lines = movers & (pieces[PieceType.WQ.value] | pieces[PieceType.WR.value])
+    diagonals = movers & (pieces[PieceType.WQ.value] | pieces[PieceType.WB.value])
+    for group, offset in zip(SLIDE_GROUPS, SLIDE_OFFSETS):
+        targets[:, group] = slide_attacks(lines if offset in LINE_OFFSETS else diagonals, slider_empty, offset) & allowed
+
+    knights = movers & pieces[PieceType.WN.value]
+    for group, offset in zip(KNIGHT_GROUPS, KNIGHT_OFFSETS):
+        targets[:, group] = step(knights, offset) & allowed
+
+    pawns = movers & pieces[PieceType.WP.value]
+    single = step(pawns, -8) & empty
+    targets[:, PUSH] = single & check_mask
+    targets[:, DOUBLE_PUSH] = step(single & shift(ROW_6, -8), -8) & empty & check_mask
+    targets[:, CAPTURE_RIGHT] = step(pawns, -7) & enemy & check_mask
+    targets[:, CAPTURE_LEFT] = step(pawns, -9) & enemy & check_mask
+
+    for promotion_group, group in zip(PROMOTION_GROUPS, (PUSH, CAPTURE_RIGHT, CAPTURE_LEFT)):
+        targets[:, promotion_group] = targets[:, group] & ROW_0
+        targets[:, group] &= ~ROW_0
+
+    return targets, in_check
+
+def count_moves(targets):
+    """ Number of legal moves on each board, from generate_move_sets
+    """
+    return np.bitwise_count(targets).astype(np.int64) @ GROUP_WEIGHTS
+
+def group_origins(boards, rows, groups, to_squares):
+    """ From squares of moves given by board row, group and target square (on the relative boards)
+    """
+    offsets = GROUP_OFFSETS[groups]
+    origins = to_squares - offsets
+
+    # a slider is the first friendly piece found walking back from its target
+    sliding = np.flatnonzero(groups < len(SLIDE_OFFSETS))
+    found = np.zeros(len(sliding), dtype=bool)
+    for distance in range(1, 8):
+        squares = np.clip(to_squares[sliding] - offsets[sliding] * distance, 0, 63)
+        piece = boards[rows[sliding], squares]
+        hit = ~found & (piece > 0) & (piece <= PieceType.WP.value)
+        origins[sliding[hit]] = squares[hit]
+        found |= hit
+    return origins
+
+def absolute_moves(sides, from_squares, to_squares, promotion_index):
+    """ Relative (white to move) squares back to the real board, with the promotion piece (0 for none)
+    """
+    black = sides == BLACK
+    from_squares = np.where(black, from_squares ^ 56, from_squares)
+    to_squares = np.where(black, to_squares ^ 56, to_squares)
+    promotions = np.where(promotion_index >= 0, PROMOTIONS[np.maximum(promotion_index, 0)] + 6 * black, 0).astype(np.int8)
+    return from_squares, to_squares, promotions
+
+def list_moves(boards, sides, targets):
+    """ Every legal move of the given boards, in the order ChessNode lists them
+
+    Returns (board row, from, to, promotion piece) arrays, grouped by board row.
+    """
+    relative = relative_boards(boards, sides)
+    bits = np.unpackbits(targets.view(np.uint8).reshape(len(targets), GROUP_COUNT, 8), axis=2, bitorder='little')
+    rows, groups, to_squares = np.nonzero(bits)
+
+    # one move per promotion piece
+    copies = GROUP_WEIGHTS[groups]
+    rows, groups, to_squares = np.repeat(rows, copies), np.repeat(groups, copies), np.repeat(to_squares, copies)
+    promotion_index = np.arange(len(groups)) - np.repeat(np.cumsum(copies) - copies, copies)
+    promotion_index = np.where(GROUP_WEIGHTS[groups] > 1, promotion_index, -1)
+
+    from_squares = group_origins(relative, rows, groups, to_squares)
+    from_squares, to_squares, promotions = absolute_moves(sides[rows], from_squares, to_squares, promotion_index)
+
+    # king moves first, then the other pieces from the lowest square up
+    moving_pieces = boards[rows, from_squares]
+    is_king = (moving_pieces == PieceType.WK.value) | (moving_pieces == PieceType.BK.value)
+    keys = ((~is_king).astype(np.int64) << 20) | (from_squares.astype(np.int64) << 12) | (MOVE_RANKS[moving_pieces, from_squares, to_squares].astype(np.int64) << 2) | np.maximum(promotion_index, 0)
+    order = np.lexsort((keys, rows))
+    return rows[order], from_squares[order], to_squares[order], promotions[order]
+
+def pick_moves(boards, sides, targets, picks):
+    """ The picks[i]-th legal move of each board (in group order), as (from, to, promotion piece) arrays
+    """
+    weighted = np.bitwise_count(targets).astype(np.int64) * GROUP_WEIGHTS
+    passed = np.cumsum(weighted, axis=1)
+    rows = np.arange(len(targets))
+    groups = np.argmax(passed > picks[:, None], axis=1)
+    index = picks - (passed[rows, groups] - weighted[rows, groups])
+
+    promotion_index = np.where(GROUP_WEIGHTS[groups] > 1, index % 4, -1)
+    bit_index = np.where(GROUP_WEIGHTS[groups] > 1, index // 4, index)
+
+    bits = np.unpackbits(targets[rows, groups].view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    to_squares = np.argmax(np.cumsum(bits, axis=1) > bit_index[:, None], axis=1)
+
+    from_squares = group_origins(relative_boards(boards, sides), rows, groups, to_squares)
+    return absolute_moves(sides, from_squares, to_squares, promotion_index)
+
+def apply_moves(boards, sides, values, last_progress, from_squares, to_squares, promotions):
+    """ Plays one move on each board in place, with the draw rules of ChessNode.make_move
+
+    values holds (white, black) material per board. Returns which boards became a draw.
+    """
+    rows = np.arange(len(boards))
+    moving_pieces = boards[rows, from_squares]
+    taken_pieces = boards[rows, to_squares]
+
+    boards[rows, to_squares] = np.where(promotions != 0, promotions, moving_pieces)
+    boards[rows, from_squares] = PieceType.E.value
+
+    values[rows, sides ^ 1] -= VALUES[taken_pieces]
+    values[rows, sides] += np.where(promotions != 0, VALUES[promotions] - VALUES[moving_pieces], 0)
+
+    progress = (promotions == 0) & (taken_pieces == PieceType.E.value)
+    last_progress[:] = np.where(progress, last_progress + 1, 0)
+    sides ^= 1
+
+    # took the last takable piece, or 50 moves with no progress
+    return np.where(taken_pieces != PieceType.E.value, (values[:, 0] == 0) & (values[:, 1] == 0), last_progress >= 50)
+
+
+class BatchRollout():
+    """ Simulates many games to their end at once, one ply for every unfinished game per step, with the NaiveBot policy
+    done as array operations over the whole batch
+    """
+
+    def __init__(self, positions : List[ChessNode], random_move_odds : int = 4, seed : int = None):
+        for position in positions:
+            if position.board is None:
+                position.restore_position()
+
+        self.boards = np.array([np.frombuffer(bytes(position.board), dtype=np.int8) for position in positions]).reshape(-1, 64)
+        self.sides = np.array([position.move for position in positions], dtype=np.int64)
+        self.values = np.array([(position.white_piece_value, position.black_piece_value) for position in positions], dtype=np.int16).reshape(-1, 2)
+        self.last_progress = np.array([position.last_progress for position in positions], dtype=np.int16)
+        self.states = np.array([position.state_evaluation for position in positions], dtype=np.int8)
+
+        self.random_move_odds = random_move_odds
+        self.rng = np.random.default_rng(seed)
+        self.plies = 0
+
+    def play(self):
+        """ Plays every game to its end, returns the stats index of each result (0 white, 1 black, 2 draw)
+        """
+        while True:
+            active = np.flatnonzero(self.states == StateEvaluation.PLAY.value)
+            if len(active) == 0:
+                break
+
+            boards, sides = self.boards[active], self.sides[active]
+            targets, in_check = generate_move_sets(relative_boards(boards, sides))
+            counts = count_moves(targets)
+
+            over = counts == 0
+            self.states[active[over]] = np.where(in_check[over], StateEvaluation.CHECKMATE.value, StateEvaluation.STALEMATE.value)
+
+            playing = np.flatnonzero(~over)
+            if len(playing) == 0:
+                break
+            active, boards, sides, targets, counts = active[playing], boards[playing], sides[playing], targets[playing], counts[playing]
+
+            # same odds as NaiveBot: a random move unless randint(0, random_move_odds) comes up 0
+            chosen_random = self.rng.integers(0, self.random_move_odds + 1, size=len(active)) != 0
+
+            from_squares = np.zeros(len(active), dtype=np.int64)
+            to_squares = np.zeros(len(active), dtype=np.int64)
+            promotions = np.zeros(len(active), dtype=np.int8)
+
+            picks = np.flatnonzero(chosen_random)
+            if len(picks) > 0:
+                moves = pick_moves(boards[picks], sides[picks], targets[picks], self.rng.integers(0, counts[picks]))
+                from_squares[picks], to_squares[picks], promotions[picks] = moves
+
+            greedy = np.flatnonzero(~chosen_random)
+            if len(greedy) > 0:
+                moves = self.suggest_moves(boards[greedy], sides[greedy], targets[greedy], active[greedy])
+                from_squares[greedy], to_squares[greedy], promotions[greedy] = moves
+
+            draws = self.play_moves(active, from_squares, to_squares, promotions)
+            self.states[active[draws]] = StateEvaluation.DRAW.value
+            self.plies += len(active)
+
+        return self.results()
+
+    def play_moves(self, active, from_squares, to_squares, promotions):
+        """ apply_moves on the given games, returns which of them became a draw
+        """
+        boards, sides, values, last_progress = self.boards[active], self.sides[active], self.values[active], self.last_progress[active]
+        draws = apply_moves(boards, sides, values, last_progress, from_squares, to_squares, promotions)
+        self.boards[active], self.sides[active], self.values[active], self.last_progress[active] = boards, sides, values, last_progress
+        return draws
+
+    def suggest_moves(self, boards, sides, targets, active):
+        """ NaiveBot's choice for each board: a move that ends the game, else the one leaving the opponent the least
+        material, else (on a tie) the first one giving the most moves back
+        """
+        rows, from_squares, to_squares, promotions = list_moves(boards, sides, targets)
+
+        # every move played on its own copy of the board
+        child_boards = boards[rows]
+        child_sides = sides[rows].copy()
+        child_values = self.values[active][rows]
+        child_progress = self.last_progress[active][rows]
+        draws = apply_moves(child_boards, child_sides, child_values, child_progress, from_squares, to_squares, promotions)
+
+        opponent_moves = count_moves(generate_move_sets(relative_boards(child_boards, child_sides))[0])
+        mobility = count_moves(generate_move_sets(relative_boards(child_boards, child_sides ^ 1))[0])
+        opponent_value = child_values[np.arange(len(rows)), child_sides]
+
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        lengths = np.diff(np.r_[starts, len(rows)])
+        position = np.arange(len(rows))
+        last = len(rows)
+
+        def first(condition):
+            return np.minimum.reduceat(np.where(condition, position, last), starts)
+
+        ends_game = first(draws | (opponent_moves == 0))
+
+        least_value = np.repeat(np.minimum.reduceat(opponent_value, starts), lengths)
+        ties = np.add.reduceat(opponent_value == least_value, starts)
+        takes_most = first(opponent_value == least_value)
+
+        most_moves = first(mobility == np.repeat(np.maximum.reduceat(mobility, starts), lengths))
+
+        chosen = np.where(ends_game < last, ends_game, np.where(ties == 1, takes_most, most_moves))
+        return from_squares[chosen], to_squares[chosen], promotions[chosen]
+
+    def results(self):
+        """ Stats index of every game's result, as ChessNode.get_result_index
+        """
+        checkmate = self.states == StateEvaluation.CHECKMATE.value
+        return np.where(checkmate, np.where(self.sides == WHITE, 1, 0), 2)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import random
+    from rollout import Rollout
+
+    # simulated plies per second, one game at a time against the whole batch in lockstep
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    start_position = ChessNode()
+
+    random.seed(0)
+    start = time.time()
+    plies = 0
+    for _ in range(min(games, 32)):
+        rollout = Rollout(start_position, random_move_odds=4)
+        rollout.play()
+        plies += rollout.plies
+    single = plies / (time.time() - start)
+    print("Rollout:       {:>9.0f} plies/s".format(single))
+
+    batch = BatchRollout([start_position] * games, random_move_odds=4, seed=0)
+    start = time.time()
+    results = batch.play()
+    batched = batch.plies / (time.time() - start)
+    print("BatchRollout:  {:>9.0f} plies/s  ({:.1f}x, {} games)".format(batched, batched / single, games))
+    print("Results (white, black, draw):", np.bincount(results, minlength=3))
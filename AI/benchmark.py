@@ -0,0 +1,189 @@
+from chess_node import *
+from mcts import mcts
+from profiler import SearchProfiler
+from tree_stats import tree_report
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import shutil
+import tempfile
+import contextlib
+from pathlib import Path
+
+try:
+    import resource # not available on Windows, peak RSS is left out there
+except ImportError:
+    resource = None
+
+
+# metrics compared against a baseline, and whether a higher value is the better one
+COMPARED_METRICS = {
+    'iterations_per_second': True,
+    'rollout_plies_per_second': True,
+    'bytes_per_node': False,
+    'peak_rss': False,
+    'save_seconds': False,
+}
+
+# values below these are timer noise, not compared
+NOISE_FLOORS = {'save_seconds': 0.01}
+
+
+def peak_rss():
+    """ Peak resident set size of this process in bytes, None where it cannot be read
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # bytes on macOS, kilobytes elsewhere
+
+def run_benchmark(iterations : int = None, duration : float = None, seed : int = 0, persist : bool = False, **tree_options):
+    """ Runs search iterations on a new tree until the iteration count or duration is reached, returns the metrics
+    """
+    if iterations is None and duration is None:
+        raise Exception("Set an iteration count or a duration.")
+
+    random.seed(seed)
+    save_dir = Path(tempfile.mkdtemp(prefix='mcts_benchmark_'))
+    tree = mcts(save_dir=save_dir, autosave=persist, **tree_options)
+    nodes_before = tree_report(tree.root)['nodes']
+
+    # phase timers only, counting calls would slow down what is being measured
+    profiler = SearchProfiler(count_calls=False)
+    tree.profiler = profiler
+
+    completed = 0
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            while (iterations is None or completed < iterations) and (duration is None or time.perf_counter() - start < duration):
+                tree.monte_carlo_tree_search(new_game=True)
+                completed += 1
+    finally:
+        profiler.close()
+        shutil.rmtree(save_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    tree.reset_current()
+    report = tree_report(tree.root, shared_nodes=tree.transpositions is not None)
+
+    return {
+        'iterations': completed,
+        'seconds': elapsed,
+        'seed': seed,
+        'persist': persist,
+        'options': tree_options,
+        'incremental_moves': ChessNode.incremental_moves,
+        'iterations_per_second': completed / elapsed,
+        'rollouts': profiler.rollouts,
+        'rollout_plies': profiler.rollout_plies,
+        'rollout_plies_per_second': profiler.rollout_plies / elapsed,
+        'average_rollout_length': profiler.rollout_plies / profiler.rollouts if profiler.rollouts > 0 else 0,
+        'nodes_created': report['nodes'] - nodes_before,
+        'peak_rss': peak_rss(),
+        'bytes_per_node': report['bytes_per_node'],
+        'save_seconds': profiler.phase_seconds.get('save', 0.0),
+        'phase_seconds': profiler.phase_seconds,
+        'root_stats': tree.root.stats,
+    }
+
+def worker_scaling(make_search, iterations : int = 200):
+    """ Prints iterations per second of a parallel search against the number of worker processes, and relative to one
+    process searching alone. make_search(tree, workers) returns the search (with run(iterations) and close()).
+    """
+    tree = mcts(autosave=False)
+    random.seed(0)
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            tree.monte_carlo_tree_search(new_game=True)
+    single = iterations / (time.time() - start)
+    print("single process: {:.1f} iterations/s".format(single))
+
+    workers = 1
+    while workers <= os.cpu_count():
+        tree = mcts(autosave=False)
+        search = make_search(tree, workers)
+
+        start = time.time()
+        search.run(iterations)
+        elapsed = time.time() - start
+        search.close()
+
+        print("{:>3} workers: {:.1f} iterations/s  ({:.2f}x)  root states {}".format(workers, iterations / elapsed, iterations / elapsed / single, tree.root.stats))
+        workers *= 2
+
+def compare_to_baseline(results : dict, baseline : dict, threshold : float = 0.1):
+    """ Regressions of more than threshold (a fraction) against the baseline, as (metric, baseline, result) tuples
+    """
+    regressions = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(metric), results.get(metric)
+        if old is None or new is None or old == 0:
+            continue
+        if max(old, new) < NOISE_FLOORS.get(metric, 0):
+            continue
+
+        change = (new - old) / old
+        if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+            regressions.append((metric, old, new))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times monte_carlo_tree_search end to end from a fixed seed")
+    parser.add_argument('--iterations', type=int, help="number of search iterations (default 100 unless --duration is set)")
+    parser.add_argument('--duration', type=float, help="seconds to search for")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--persist', action='store_true', help="save every iteration, as a normal search does (to a temporary directory)")
+    parser.add_argument('--bitboard', action='store_true', help="use the bitboard move generator")
+    parser.add_argument('--transpositions', action='store_true', help="use a transposition table")
+    parser.add_argument('--snapshot-interval', type=int, help="keep boards only every this many plies")
+    parser.add_argument('--incremental', action='store_true', help="derive tree nodes' moves from their grandparent's (ChessNode.incremental_moves)")
+    parser.add_argument('--verify-moves', action='store_true', help="with --incremental, check every derived move list against full generation")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="fraction a metric may get worse before it is flagged (default 0.1)")
+    parser.add_argument('--output', help="write the results to this file as JSON (can be used as a later baseline)")
+    args = parser.parse_args()
+
+    ChessNode.incremental_moves = args.incremental
+    ChessNode.verify_incremental_moves = args.verify_moves
+
+    if args.iterations is None and args.duration is None:
+        args.iterations = 100
+
+    results = run_benchmark(iterations=args.iterations, duration=args.duration, seed=args.seed, persist=args.persist, use_bitboard=args.bitboard,
+                            use_transpositions=args.transpositions, snapshot_interval=args.snapshot_interval)
+
+    print("Iterations:           {} in {:.2f} s ({:.1f}/s)".format(results['iterations'], results['seconds'], results['iterations_per_second']))
+    print("Rollout plies:        {} ({:.0f}/s, {:.1f} per rollout)".format(results['rollout_plies'], results['rollout_plies_per_second'], results['average_rollout_length']))
+    print("Nodes created:        {} ({:.0f} bytes/node)".format(results['nodes_created'], results['bytes_per_node']))
+    print("Peak RSS:             {}".format('n/a' if results['peak_rss'] is None else '{:.1f} MB'.format(results['peak_rss'] / 2**20)))
+    print("Time saving:          {:.3f} s".format(results['save_seconds']))
+    print("Phases:               {}".format(', '.join('{} {:.1f}%'.format(phase, seconds / results['seconds'] * 100) for phase, seconds in results['phase_seconds'].items())))
+    print("Root states:          {}".format(results['root_stats']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as ofile:
+            json.dump(results, ofile, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as ifile:
+            baseline = json.load(ifile)
+
+        for setting in ('iterations', 'seed', 'persist', 'options', 'incremental_moves'):
+            if setting != 'iterations' or args.duration is None:
+                if baseline.get(setting) != results[setting]:
+                    print("Note: the baseline was run with {} = {}".format(setting, baseline.get(setting)))
+
+        regressions = compare_to_baseline(results, baseline, threshold=args.threshold)
+        for metric, old, new in regressions:
+            print("REGRESSION {}: {:.4g} -> {:.4g} ({:+.1f}%)".format(metric, old, new, (new - old) / old * 100))
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No regressions beyond {:.0f}% against {}".format(args.threshold * 100, args.baseline))
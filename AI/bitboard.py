@@ -0,0 +1,262 @@
+from typing import List
+
+from chess_node import PieceType, Turn
+import geometry
+
+
+#* square sets are 64-bit ints where bit i is board index i (0 is a8, 63 is h1)
+
+# piece values as plain ints, the generator is too hot for enum lookups
+E = PieceType.E.value
+WK, WQ, WB, WN, WR, WP = PieceType.WK.value, PieceType.WQ.value, PieceType.WB.value, PieceType.WN.value, PieceType.WR.value, PieceType.WP.value
+BK, BQ, BB, BN, BR, BP = PieceType.BK.value, PieceType.BQ.value, PieceType.BB.value, PieceType.BN.value, PieceType.BR.value, PieceType.BP.value
+
+WHITE = Turn.White.value
+BLACK = Turn.Black.value
+
+FULL = (1 << 64) - 1
+
+
+def _to_mask(squares):
+    mask = 0
+    for square in squares:
+        mask |= 1 << square
+    return mask
+
+
+# masks built from the shared square tables in geometry
+RAYS = {offset: tuple(_to_mask(ray) for ray in rays) for offset, rays in geometry.RAYS.items()}
+
+KNIGHT_TARGETS = geometry.KNIGHT_TARGETS
+KING_TARGETS = geometry.KING_TARGETS
+KNIGHT_ATTACKS = tuple(_to_mask(targets) for targets in KNIGHT_TARGETS)
+KING_ATTACKS = tuple(_to_mask(targets) for targets in KING_TARGETS)
+
+# squares a pawn of the given color attacks from a square
+PAWN_ATTACKS = tuple(tuple(_to_mask(targets) for targets in captures) for captures in geometry.PAWN_CAPTURES)
+
+# squares strictly between two squares that share a line (0 otherwise)
+BETWEEN = tuple(tuple(_to_mask(squares) for squares in row) for row in geometry.BETWEEN)
+
+
+def slide(offset : int, square : int, occupied : int):
+    """ Squares reached from square along one direction, up to and including the first blocker
+    """
+    ray = RAYS[offset][square]
+    blockers = ray & occupied
+    if blockers:
+        if offset > 0:
+            first = (blockers & -blockers).bit_length() - 1
+        else:
+            first = blockers.bit_length() - 1
+        ray ^= RAYS[offset][first]
+    return ray
+
+def rook_attacks(square : int, occupied : int):
+    return slide(-1, square, occupied) | slide(1, square, occupied) | slide(-8, square, occupied) | slide(8, square, occupied)
+
+def bishop_attacks(square : int, occupied : int):
+    return slide(-9, square, occupied) | slide(-7, square, occupied) | slide(7, square, occupied) | slide(9, square, occupied)
+
+
+class BitBoard():
+    """ Bitboard representation of a chess position, one 64-bit int per piece type plus one per color
+    """
+
+    def __init__(self, board : List[int] = None):
+        self.pieces = [0] * 13  # indexed by PieceType value
+        self.colors = [0, 0]    # indexed by Turn value
+
+        if board is not None:
+            for square, piece in enumerate(board):
+                if piece != E:
+                    self.pieces[piece] |= 1 << square
+                    self.colors[WHITE if piece <= WP else BLACK] |= 1 << square
+
+    def copy(self):
+        new_bitboard = BitBoard()
+        new_bitboard.pieces = self.pieces[:]
+        new_bitboard.colors = self.colors[:]
+        return new_bitboard
+
+    def apply_move(self, chessMove : tuple, moving_piece : int, taken_piece : int):
+        """ Updates the bitboards for a move, given the pieces found on its from and to squares
+        """
+        from_bit = 1 << chessMove[0]
+        to_bit = 1 << chessMove[1]
+        color = WHITE if moving_piece <= WP else BLACK
+
+        if taken_piece != E:
+            self.pieces[taken_piece] ^= to_bit
+            self.colors[color ^ 1] ^= to_bit
+
+        self.pieces[moving_piece] ^= from_bit
+        self.pieces[chessMove[2] if len(chessMove) == 3 else moving_piece] ^= to_bit
+        self.colors[color] ^= from_bit | to_bit
+
+    def is_attacked(self, square : int, color : int, occupied : int):
+        """ Whether the side to move (color) would be attacked on square by the opponent, given an occupancy
+        """
+        pieces = self.pieces
+        if color == WHITE:
+            queens, rooks, bishops, knights, pawns = pieces[BQ], pieces[BR], pieces[BB], pieces[BN], pieces[BP]
+        else:
+            queens, rooks, bishops, knights, pawns = pieces[WQ], pieces[WR], pieces[WB], pieces[WN], pieces[WP]
+
+        if KNIGHT_ATTACKS[square] & knights or PAWN_ATTACKS[color][square] & pawns:
+            return True
+        if (queens | rooks) and rook_attacks(square, occupied) & (queens | rooks):
+            return True
+        if (queens | bishops) and bishop_attacks(square, occupied) & (queens | bishops):
+            return True
+        return False
+
+    def get_legal_moves(self, color : int):
+        """ Generates the same (from, to[, promo]) tuples, in the same order, as ChessNode's board scan
+
+        Returns the move list and whether the side to move is in check.
+        """
+        pieces = self.pieces
+        own = self.colors[color]
+        enemy = self.colors[color ^ 1]
+        occupied = own | enemy
+
+        if color == WHITE:
+            king, queen, rook, bishop, knight, pawn = WK, WQ, WR, WB, WN, WP
+            enemy_king = pieces[BK]
+            enemy_lines = pieces[BQ] | pieces[BR]
+            enemy_diagonals = pieces[BQ] | pieces[BB]
+            enemy_knights, enemy_pawns = pieces[BN], pieces[BP]
+        else:
+            king, queen, rook, bishop, knight, pawn = BK, BQ, BR, BB, BN, BP
+            enemy_king = pieces[WK]
+            enemy_lines = pieces[WQ] | pieces[WR]
+            enemy_diagonals = pieces[WQ] | pieces[WB]
+            enemy_knights, enemy_pawns = pieces[WN], pieces[WP]
+
+        if not pieces[king]:
+            err_msg = "King for {} not found on board.".format('white' if color == WHITE else 'black')
+            raise Exception(err_msg)
+        king_square = pieces[king].bit_length() - 1
+
+        #* checks and pins, walking out from the king
+        checkers = KNIGHT_ATTACKS[king_square] & enemy_knights
+        checkers |= PAWN_ATTACKS[color][king_square] & enemy_pawns
+        pinned = 0
+
+        for offset in (-1, 1, -8, 8, -9, -7, 7, 9):
+            attackers = enemy_lines if offset in (-1, 1, -8, 8) else enemy_diagonals
+            if not attackers & RAYS[offset][king_square]:
+                continue
+
+            ray = slide(offset, king_square, occupied)
+            first = ray & occupied
+            if first & attackers:
+                checkers |= first
+            elif first & own:
+                first_square = first.bit_length() - 1
+                second = slide(offset, first_square, occupied) & occupied
+                if second & attackers:
+                    pinned |= first
+
+        check_mask = FULL
+        if checkers:
+            checker_square = checkers.bit_length() - 1
+            check_mask = BETWEEN[king_square][checker_square] | checkers
+
+        #* king moves
+        legal_moves = []
+        king_bit = 1 << king_square
+        without_king = occupied ^ king_bit
+        enemy_king_zone = KING_ATTACKS[enemy_king.bit_length() - 1] if enemy_king else 0
+        for other_square in KING_TARGETS[king_square]:
+            target_bit = 1 << other_square
+            if target_bit & own or target_bit & enemy_king_zone:
+                continue
+            if not self.is_attacked(other_square, color, without_king):
+                legal_moves.append((king_square, other_square))
+
+        # if double check, only king moves
+        if checkers & (checkers - 1):
+            return legal_moves, True
+
+        if checkers:
+            # while in check, sliders only stop on friendly pieces and the checking piece
+            slider_occupied = own | checkers
+        else:
+            slider_occupied = occupied
+        allowed = check_mask & ~own
+
+        if color == WHITE:
+            promotions = (WQ, WR, WB, WN)
+            push, start_row, last_row = -8, 6, 0
+            captures = ((-7, 7), (-9, 0))   # (offset, column it cannot be made from)
+        else:
+            promotions = (BQ, BR, BB, BN)
+            push, start_row, last_row = 8, 1, 7
+            captures = ((7, 0), (9, 7))
+
+        movers = own & ~pinned & ~king_bit
+        while movers:
+            bit = movers & -movers
+            movers ^= bit
+            current_square = bit.bit_length() - 1
+
+            if bit & pieces[knight]:
+                for other_square in KNIGHT_TARGETS[current_square]:
+                    if (1 << other_square) & allowed:
+                        legal_moves.append((current_square, other_square))
+                continue
+
+            if bit & pieces[pawn]:
+                row = current_square // 8
+                col = current_square % 8
+                other_square = current_square + push
+                if not (1 << other_square) & occupied:
+                    if (1 << other_square) & check_mask:
+                        if other_square // 8 == last_row:
+                            for promotion in promotions:
+                                legal_moves.append((current_square, other_square, promotion))
+                        else:
+                            legal_moves.append((current_square, other_square))
+                    if row == start_row:
+                        other_square += push
+                        if not (1 << other_square) & occupied and (1 << other_square) & check_mask:
+                            legal_moves.append((current_square, other_square))
+
+                for offset, blocked_col in captures:
+                    if col == blocked_col:
+                        continue
+                    other_square = current_square + offset
+                    if (1 << other_square) & enemy & check_mask:
+                        if other_square // 8 == last_row:
+                            for promotion in promotions:
+                                legal_moves.append((current_square, other_square, promotion))
+                        else:
+                            legal_moves.append((current_square, other_square))
+                continue
+
+            if bit & (pieces[rook] | pieces[queen]):
+                for offset in (-1, 1, -8, 8):
+                    self._add_slides(legal_moves, current_square, offset, slider_occupied, allowed)
+
+            if bit & (pieces[bishop] | pieces[queen]):
+                for offset in (-9, -7, 7, 9):
+                    self._add_slides(legal_moves, current_square, offset, slider_occupied, allowed)
+
+        return legal_moves, bool(checkers)
+
+    def _add_slides(self, move_list : List, current_square : int, offset : int, occupied : int, allowed : int):
+        targets = slide(offset, current_square, occupied) & allowed
+
+        # walk the ray outward from the piece so moves come out nearest first
+        if offset > 0:
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                move_list.append((current_square, bit.bit_length() - 1))
+        else:
+            while targets:
+                other_square = targets.bit_length() - 1
+                targets ^= 1 << other_square
+                move_list.append((current_square, other_square))
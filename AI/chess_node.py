@@ -5,6 +5,12 @@ from typing import List
 from colorama import just_fix_windows_console
 from termcolor import colored
 import sys
+from bisect import insort
+from collections import deque
+from types import MappingProxyType
+
+import zobrist
+from geometry import RAYS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KNIGHT_TARGETS, KING_TARGETS, PAWN_PUSHES, PAWN_CAPTURES, BETWEEN, DIRECTION, ZONE_LINE_RAYS, ZONE_DIAGONAL_RAYS
 
  
 class StateEvaluation(Enum):
@@ -40,55 +46,212 @@ class Turn(Enum):
     White = 0
     Black = 1
 
+# color of each piece type, indexed by PieceType value (None for an empty square)
+PIECE_COLORS = (None,) + (Turn.White.value,) * 6 + (Turn.Black.value,) * 6
+EMPTY = PieceType.E.value
+
+# material value of each piece type, indexed by PieceType value (kings count for nothing)
+PIECE_VALUES = (0, 0, 9, 3, 3, 5, 1, 0, 9, 3, 3, 5, 1)
+
+# both colors' knights and pawns
+KNIGHT_PIECES = (PieceType.WN.value, PieceType.BN.value)
+PAWN_PIECES = (PieceType.WP.value, PieceType.BP.value)
+
+# attack tables of the pieces that step (kings, knights, pawns) and whether a piece slides along lines / diagonals,
+# indexed by PieceType value
+STEP_ATTACKS = (None, KING_TARGETS, None, None, KNIGHT_TARGETS, None, PAWN_CAPTURES[Turn.White.value],
+                KING_TARGETS, None, None, KNIGHT_TARGETS, None, PAWN_CAPTURES[Turn.Black.value])
+LINE_SLIDERS = (False, False, True, False, False, True, False, False, True, False, False, True, False)
+DIAGONAL_SLIDERS = (False, False, True, True, False, False, False, False, True, True, False, False, False)
+
+# pieces that check a king of each color (indexed by Turn value): along lines, along diagonals, knight, pawn
+KING_ATTACKERS = (
+    ((PieceType.BQ.value, PieceType.BR.value), (PieceType.BQ.value, PieceType.BB.value), PieceType.BN.value, PieceType.BP.value),
+    ((PieceType.WQ.value, PieceType.WR.value), (PieceType.WQ.value, PieceType.WB.value), PieceType.WN.value, PieceType.WP.value),
+)
+
+# squares whose contents decide the moves of a knight or pawn, indexed by PieceType value (None for other pieces)
+STEP_REACH = tuple(tuple(PAWN_CAPTURES[color][square] + PAWN_PUSHES[color][square] for square in range(64)) if piece in PAWN_PIECES
+                   else KNIGHT_TARGETS if piece in KNIGHT_PIECES else None
+                   for piece, color in zip(range(13), PIECE_COLORS))
+
+class CheckMoves(list):
+    """ Move list of a position in check, cached lists are marked so incremental generation does not build on them
+    """
+
+# shared stand-in for the children of a leaf, nodes only allocate a dict once they get a child
+EMPTY_CHILDREN = MappingProxyType({})
+
 class ChessNode():
     """ Chess Node containing all chess data for a given configuration
     """
 
-    def __init__(self, import_board : List[int] = None, last_move : tuple = None, state_evaluation : int = StateEvaluation.PLAY.value, last_progress : int = 0, parent = None, stats : List = [0, 0, 0]):
-        self.children : dict[tuple, ChessNode] = {}
-        self.move = Turn.White.value
-        self.white_can_castle = True
-        self.black_can_castle = True
+    # no per-node __dict__, trees hold millions of these
+    __slots__ = ('_children', 'parent', 'board', 'move', 'last_move', 'state_evaluation', 'last_progress',
+                 'white_wins', 'black_wins', 'draws', 'piece_squares', 'king_squares', 'white_piece_value', 'black_piece_value',
+                 'zobrist_hash', 'legal_moves_cache', 'bitboard', 'tree_source')
+
+    # legal move lists are memoized per node, move_cache_limit (if set) caps how many nodes hold one
+    move_cache_enabled = True
+    move_cache_limit = None
+    move_cache_order = deque()
+
+    # derive a node's moves from its grandparent's cached list where the last two moves leave them unchanged, and
+    # optionally check every derived list against full generation
+    incremental_moves = False
+    verify_incremental_moves = False
+
+    def __init__(self, import_board : List[int] = None, last_move : tuple = None, state_evaluation : int = StateEvaluation.PLAY.value, last_progress : int = 0, parent = None, stats : List = [0, 0, 0], use_bitboard : bool = False, piece_squares : List[bytearray] = None, zobrist_hash : int = None, side_to_move : int = Turn.White.value):
+        self._children = None
+        self.tree_source = None # (loader, record index) while the children are still on disk, see tree_file.LazyTree
+        self.move = side_to_move
 
         self.last_move = last_move
         self.state_evaluation = state_evaluation
         self.last_progress = last_progress
         
         self.parent = None
-        self.stats = stats[:]
+        self.white_wins, self.black_wins, self.draws = stats
+        self.legal_moves_cache = None
         
+        # one byte per square, holding the PieceType value
         if import_board is None:
-            self.board = ChessNode.get_starting_board()
-
-            self.black_piece_value = 39
-            self.white_piece_value = 39
-
+            self.board = bytearray(ChessNode.get_starting_board())
         else:
-            self.board = import_board[:]
-
-            self.black_piece_value = 0
-            self.white_piece_value = 0
-            
-            for piece in self.board:
-                if piece == PieceType.WQ.value:
-                    self.white_piece_value += 9
-                elif piece == PieceType.WR.value:
-                    self.white_piece_value += 5
-                elif piece == PieceType.WN.value or piece == PieceType.WB.value:
-                    self.white_piece_value += 3
-                elif piece == PieceType.WP.value:
-                    self.white_piece_value += 1
-                
-                elif piece == PieceType.BQ.value:
-                    self.black_piece_value += 9
-                elif piece == PieceType.BR.value:
-                    self.black_piece_value += 5
-                elif piece == PieceType.BN.value or piece == PieceType.BB.value:
-                    self.black_piece_value += 3
-                elif piece == PieceType.BP.value:
-                    self.black_piece_value += 1
+            self.board = bytearray(import_board)
+
+        self.index_pieces(piece_squares)
+
+        # 64-bit position key (pieces and side to move, so positions with Black to move pass side_to_move rather than
+        # setting move afterwards), create_child passes it on already updated
+        if zobrist_hash is None:
+            zobrist_hash = zobrist.hash_position(self.board, self.move)
+        self.zobrist_hash = zobrist_hash
+
+        # optional bitboard copy of the position, children inherit it through create_child
+        self.bitboard = None
+        if use_bitboard:
+            from bitboard import BitBoard # bitboard depends on the enums in this module
+            self.bitboard = BitBoard(self.board)
+
+    def index_pieces(self, piece_squares : List[bytearray] = None):
+        """ Sets the piece lists, king squares and material values from the board
+        """
+        # sorted squares of each color's pieces, indexed by Turn value (create_child passes them on already updated)
+        if piece_squares is None:
+            piece_squares = [bytearray(), bytearray()]
+            for square, piece in enumerate(self.board):
+                if piece != EMPTY:
+                    piece_squares[PIECE_COLORS[piece]].append(square)
+        self.piece_squares = piece_squares
+
+        king_squares = [None, None]
+        self.white_piece_value = 0
+        self.black_piece_value = 0
+
+        for square in piece_squares[Turn.White.value]:
+            piece = self.board[square]
+            if piece == PieceType.WK.value:
+                king_squares[Turn.White.value] = square
+            self.white_piece_value += PIECE_VALUES[piece]
+        
+        for square in piece_squares[Turn.Black.value]:
+            piece = self.board[square]
+            if piece == PieceType.BK.value:
+                king_squares[Turn.Black.value] = square
+            self.black_piece_value += PIECE_VALUES[piece]
+
+        self.king_squares = tuple(king_squares)
+
+    def release_position(self):
+        """ Drops the board and everything derived from it, restore_position rebuilds them when needed
+        """
+        self.board = None
+        self.piece_squares = None
+        self.king_squares = None
+        self.bitboard = None
+        self.legal_moves_cache = None
+
+    def restore_position(self):
+        """ Rebuilds a released board by replaying moves from the nearest ancestor that still holds one
+        """
+        path = []
+        node = self
+        while node.board is None:
+            parent = node.parent
+            if parent is None:
+                raise Exception("No ancestor holds a board to rebuild the position from.")
+
+            # a node shared through a transposition may hang under its parent by a different move than the one it was made with
+            chessMove = node.last_move
+            if parent.children.get(chessMove) is not node:
+                chessMove = next(move for move, child in parent.children.items() if child is node)
+
+            path.append(chessMove)
+            node = parent
+
+        position = node.copy()
+        for chessMove in reversed(path):
+            position.make_move(chessMove)
+
+        self.board = position.board
+        self.piece_squares = position.piece_squares
+        self.king_squares = position.king_squares
+        self.bitboard = position.bitboard
+
+    @property
+    def children(self):
+        """ Move to child node mapping, read-only until the node has a child (add children with add_child)
+        """
+        if self._children is None:
+            if self.tree_source is None:
+                return EMPTY_CHILDREN
+            self.tree_source[0].hydrate(self)
+        return self._children
+
+    @property
+    def stats(self):
+        """ (white wins, black wins, draws) through this node
+        """
+        return (self.white_wins, self.black_wins, self.draws)
+
+    def add_child(self, chessMove : tuple, node):
+        if self._children is None and self.tree_source is not None:
+            self.tree_source[0].hydrate(self)
+        if self._children is None:
+            self._children = {}
+        self._children[chessMove] = node
+
+    def __getstate__(self):
+        # children still on disk are read in so they are saved too
+        if self._children is None and self.tree_source is not None:
+            self.tree_source[0].hydrate(self)
+
+        # cached move lists are cheap to regenerate, keep them out of saved trees
+        return tuple(None if name == 'legal_moves_cache' or name == 'tree_source' else getattr(self, name) for name in ChessNode.__slots__)
+
+    def __setstate__(self, state):
+        self.tree_source = None
+
+        if not isinstance(state, dict):
+            for name, value in zip(ChessNode.__slots__, state):
+                setattr(self, name, value)
+            return
+
+        # trees pickled before nodes had slots: keep the search data, rebuild everything derived from the board
+        self._children = state['children'] if len(state['children']) > 0 else None
+        self.parent = state['parent']
+        self.board = bytearray(state['board'])
+        self.move = state['move']
+        self.last_move = state['last_move']
+        self.state_evaluation = state['state_evaluation']
+        self.last_progress = state['last_progress']
+        self.white_wins, self.black_wins, self.draws = state['stats']
+        self.index_pieces()
+        self.zobrist_hash = zobrist.hash_position(self.board, self.move)
+        self.legal_moves_cache = None
+        self.bitboard = None
 
-    
     def get_starting_board():
         board = [PieceType.E.value] * 64
 
@@ -149,12 +312,37 @@ class ChessNode():
         return node
     
     def backpropogate_results(self, result_append_index):
-        self.stats[result_append_index] += 1
+        current = self
+        if result_append_index == 0:
+            while current is not None:
+                current.white_wins += 1
+                current = current.parent
+        elif result_append_index == 1:
+            while current is not None:
+                current.black_wins += 1
+                current = current.parent
+        else:
+            while current is not None:
+                current.draws += 1
+                current = current.parent
 
-        current = self.parent
-        while current is not None:
-            current.stats[result_append_index] += 1
-            current = current.parent
+    def get_child_hash(self, chessMove : tuple):
+        """ Zobrist hash of the position after chessMove, without creating the child
+        """
+        if type(chessMove[0]) is not int:
+            chessMove = (self.square_to_board_index(chessMove[0]), self.square_to_board_index(chessMove[1]))
+
+        if self.board is None:
+            self.restore_position()
+
+        moving_piece = self.board[chessMove[0]]
+        placed_piece = chessMove[2] if len(chessMove) == 3 else moving_piece
+
+        child_hash = self.zobrist_hash ^ zobrist.BLACK_TO_MOVE
+        child_hash ^= zobrist.PIECE_KEYS[moving_piece][chessMove[0]]
+        child_hash ^= zobrist.PIECE_KEYS[self.board[chessMove[1]]][chessMove[1]] # taken piece, if any
+        child_hash ^= zobrist.PIECE_KEYS[placed_piece][chessMove[1]]
+        return child_hash
 
     def create_child(self, chessMove : tuple, make_orphan=False, get_if_exists=False):
 
@@ -165,54 +353,52 @@ class ChessNode():
         
         if type(chessMove[0]) is not int:
             chessMove = (self.square_to_board_index(chessMove[0]), self.square_to_board_index(chessMove[1]))
+
+        if self.board is None:
+            self.restore_position()
     
+        moving_piece = self.board[chessMove[0]]
         piece_to_be_taken = self.board[chessMove[1]]
         
         new_board = self.board[:]
 
-        promotion_side = 0
+        promotion = False
         if len(chessMove) == 3: # pawn promotion
             new_board[chessMove[1]] = chessMove[2]
-
-            if chessMove[2] <= PieceType.WP.value:
-                promotion_side = 1 # white
-            else:
-                promotion_side = 2 # black
-
+            promotion = True
         else:
             new_board[chessMove[1]] = new_board[chessMove[0]]
         
         new_board[chessMove[0]] = PieceType.E.value
+
+        # move the piece in its color's list, and drop a taken piece from the other
+        color = PIECE_COLORS[moving_piece]
+        piece_squares = self.piece_squares[:]
+        piece_squares[color] = piece_squares[color][:]
+        piece_squares[color].remove(chessMove[0])
+        insort(piece_squares[color], chessMove[1])
+
+        if piece_to_be_taken != PieceType.E.value:
+            if piece_to_be_taken == PieceType.WK.value or piece_to_be_taken == PieceType.BK.value:
+                self.print_board()
+                print("Move to be done:", chessMove)
+                raise Exception("{} King was about to be taken.".format('White' if piece_to_be_taken == PieceType.WK.value else 'Black'))
+            piece_squares[color ^ 1] = piece_squares[color ^ 1][:]
+            piece_squares[color ^ 1].remove(chessMove[1])
             
-        new_node = ChessNode(import_board=new_board, last_move=chessMove, state_evaluation=self.state_evaluation, last_progress=self.last_progress + 1)
-        new_node.move = Turn.Black.value if self.move == Turn.White.value else Turn.White.value
+        new_node = ChessNode(import_board=new_board, last_move=chessMove, state_evaluation=self.state_evaluation, last_progress=self.last_progress + 1, piece_squares=piece_squares, zobrist_hash=self.get_child_hash(chessMove), side_to_move=self.move ^ 1)
+
+        if self.bitboard is not None:
+            new_node.bitboard = self.bitboard.copy()
+            new_node.bitboard.apply_move(chessMove, moving_piece, piece_to_be_taken)
         
-        if promotion_side > 0:
+        if promotion:
             new_node.last_progress = 0
-            
-            if promotion_side == 1:
-                new_node.white_piece_value += self.get_piece_value(chessMove[2])
-            else:
-                new_node.black_piece_value += self.get_piece_value(chessMove[2])
-
 
         is_draw = False
         if piece_to_be_taken != PieceType.E.value:
             new_node.last_progress = 0 # reset move draw counter
 
-            if piece_to_be_taken <= PieceType.WP.value:
-                if piece_to_be_taken == PieceType.WK.value:
-                    self.print_board()
-                    print("Move to be done:", chessMove)
-                    raise Exception("White King was about to be taken.")
-                new_node.white_piece_value -= self.get_piece_value(piece_to_be_taken)
-            else:
-                if piece_to_be_taken == PieceType.BK.value:
-                    self.print_board()
-                    print("Move to be done:", chessMove)
-                    raise Exception("Black King was about to be taken.")
-                new_node.black_piece_value -= self.get_piece_value(piece_to_be_taken)
-
             if new_node.black_piece_value == 0 and new_node.white_piece_value == 0: # took last takable piece
                 new_node.state_evaluation = StateEvaluation.DRAW.value
                 is_draw = True
@@ -224,13 +410,121 @@ class ChessNode():
         if make_orphan:
             return new_node
         
-        self.children[chessMove] = new_node
-        self.children[chessMove].parent = self
+        self.add_child(chessMove, new_node)
+        new_node.parent = self
         
         if is_draw:
-            self.children[chessMove].backpropogate_results(2) # 2 is draw tally index
+            new_node.backpropogate_results(2) # 2 is draw tally index
+
+        return new_node
+
+    def copy(self):
+        """ Orphan node holding the same position, without children or stats (scratch board for make_move)
+        """
+        if self.board is None:
+            self.restore_position()
 
-        return self.children[chessMove]
+        piece_squares = [self.piece_squares[0][:], self.piece_squares[1][:]]
+        new_node = ChessNode(import_board=self.board, last_move=self.last_move, state_evaluation=self.state_evaluation, last_progress=self.last_progress, piece_squares=piece_squares, zobrist_hash=self.zobrist_hash, side_to_move=self.move)
+
+        if self.bitboard is not None:
+            new_node.bitboard = self.bitboard.copy()
+
+        return new_node
+
+    def make_move(self, chessMove : tuple):
+        """ Plays chessMove on this node in place and returns what unmake_move needs to take it back
+
+        Only for scratch nodes from copy(), a node with children would no longer match them.
+        """
+        if len(self.children) > 0:
+            raise Exception("Tried to play a move in place on a node with children.")
+
+        board = self.board
+        moving_piece = board[chessMove[0]]
+        piece_to_be_taken = board[chessMove[1]]
+
+        if piece_to_be_taken == PieceType.WK.value or piece_to_be_taken == PieceType.BK.value:
+            raise Exception("{} King was about to be taken.".format('White' if piece_to_be_taken == PieceType.WK.value else 'Black'))
+
+        undo = (chessMove, moving_piece, piece_to_be_taken, self.move, self.last_move, self.state_evaluation, self.last_progress, self.white_piece_value, self.black_piece_value, self.zobrist_hash, self.legal_moves_cache)
+        
+        self.zobrist_hash = self.get_child_hash(chessMove)
+        self.legal_moves_cache = None
+
+        board[chessMove[1]] = chessMove[2] if len(chessMove) == 3 else moving_piece
+        board[chessMove[0]] = PieceType.E.value
+
+        color = PIECE_COLORS[moving_piece]
+        self.piece_squares[color].remove(chessMove[0])
+        insort(self.piece_squares[color], chessMove[1])
+
+        if moving_piece == PieceType.WK.value or moving_piece == PieceType.BK.value:
+            self.king_squares = (chessMove[1], self.king_squares[1]) if color == Turn.White.value else (self.king_squares[0], chessMove[1])
+
+        if self.bitboard is not None:
+            self.bitboard.apply_move(chessMove, moving_piece, piece_to_be_taken)
+
+        self.last_move = chessMove
+        self.last_progress += 1
+        self.move = Turn.Black.value if self.move == Turn.White.value else Turn.White.value
+
+        if len(chessMove) == 3: # pawn promotion
+            self.last_progress = 0
+            if color == Turn.White.value:
+                self.white_piece_value += PIECE_VALUES[chessMove[2]] - PIECE_VALUES[moving_piece]
+            else:
+                self.black_piece_value += PIECE_VALUES[chessMove[2]] - PIECE_VALUES[moving_piece]
+
+        # same draw rules as create_child
+        if piece_to_be_taken != PieceType.E.value:
+            self.last_progress = 0 # reset move draw counter
+            self.piece_squares[color ^ 1].remove(chessMove[1])
+
+            if color == Turn.White.value:
+                self.black_piece_value -= PIECE_VALUES[piece_to_be_taken]
+            else:
+                self.white_piece_value -= PIECE_VALUES[piece_to_be_taken]
+
+            if self.black_piece_value == 0 and self.white_piece_value == 0: # took last takable piece
+                self.state_evaluation = StateEvaluation.DRAW.value
+        
+        elif self.last_progress >= 50: # 50 moves with no progress
+            self.state_evaluation = StateEvaluation.DRAW.value
+
+        return undo
+
+    def unmake_move(self, undo : tuple):
+        """ Takes back a move played with make_move
+        """
+        chessMove, moving_piece, piece_to_be_taken, self.move, self.last_move, self.state_evaluation, self.last_progress, self.white_piece_value, self.black_piece_value, self.zobrist_hash, self.legal_moves_cache = undo
+
+        self.board[chessMove[0]] = moving_piece
+        self.board[chessMove[1]] = piece_to_be_taken
+
+        color = PIECE_COLORS[moving_piece]
+        self.piece_squares[color].remove(chessMove[1])
+        insort(self.piece_squares[color], chessMove[0])
+
+        if piece_to_be_taken != PieceType.E.value:
+            insort(self.piece_squares[color ^ 1], chessMove[1])
+
+        if moving_piece == PieceType.WK.value or moving_piece == PieceType.BK.value:
+            self.king_squares = (chessMove[0], self.king_squares[1]) if color == Turn.White.value else (self.king_squares[0], chessMove[0])
+
+        if self.bitboard is not None:
+            self.bitboard.apply_move(chessMove, moving_piece, piece_to_be_taken) # moves are their own inverse on bitboards
+
+    def get_result_index(self):
+        """ Stats index a terminal state counts towards (0 white win, 1 black win, 2 draw), None while in play
+        """
+        if self.state_evaluation == StateEvaluation.PLAY.value:
+            return None
+        
+        if self.state_evaluation == StateEvaluation.CHECKMATE.value:
+            return 1 if self.move == Turn.White.value else 0
+        
+        return 2
 
     def get_last_move(self, chess_syntax=False):
         if self.last_move is None:
@@ -242,6 +536,9 @@ class ChessNode():
         return self.last_move
 
     def print_board(self):
+        if self.board is None:
+            self.restore_position()
+
         print("______________________")
         for row in range(8):
             print("|", end='')
@@ -297,638 +594,106 @@ class ChessNode():
         return ((ord('8') - ord(square[1])) * 8) +  (ord(str.lower(square[0])) - ord('a')) 
 
     def is_same_color(self, piece1 : int, piece2 : int):
-        if piece1 <= PieceType.WP.value and piece1 > PieceType.E.value:
-            if piece2 <= PieceType.WP.value and piece2 > PieceType.E.value:
-                return True
-        
-        if piece1 <= PieceType.BP.value and piece1 > PieceType.WP.value:
-            if piece2 <= PieceType.BP.value and piece2 > PieceType.WP.value:
-                return True
-        return False
+        color1 = PIECE_COLORS[piece1]
+        return color1 is not None and color1 == PIECE_COLORS[piece2]
 
-    def get_checks_and_pins(self, king_square, return_check_bool = False):
+    def get_checks_and_pins(self, king_square):
+        """ Checks on the king and pieces pinned to it, in one scan outwards from the king
+        """
+        board = self.board
+        king_color = PIECE_COLORS[board[king_square]]
 
         pinned_squares = []
         in_check = False
         check_path = []
 
-        valid_king_directions = [True] * 8 # [top-left, top, top-right, left, right, bottom-left, bottom, bottom-right]
+        line_attackers, diagonal_attackers, enemy_knight, enemy_pawn = KING_ATTACKERS[self.move]
+        pawn_color = self.move
 
-        #* check rook and queen attacks
+        #* check rook and queen attacks, then bishop and queen attacks
+        for offset in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            attackers = line_attackers if offset in ROOK_DIRECTIONS else diagonal_attackers
+            ally_square = None # friendly piece in this path
 
-        # check left
-        other_square = king_square - 1
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square >= 0 and (other_square % 8) < 7:
-            piece_path.append(other_square)
+            for other_square in RAYS[offset][king_square]:
+                other_piece = board[other_square]
+                if other_piece == EMPTY:
+                    continue
 
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BR.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WR.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                                               # king is in check
-                            check_path.extend(piece_path)                                 # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square - 1:
-                                valid_king_directions[4] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[3] = valid_king_directions[4] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
+                # if piece encountered in path is friendly, remember it (a second one ends the path)
+                if PIECE_COLORS[other_piece] == king_color:
+                    if ally_square is not None:
                         break
+                    ally_square = other_square
+                    continue
 
-            other_square -= 1 # continue down path
-        
-        # check right
-        other_square = king_square + 1
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square < 64 and (other_square % 8) > 0:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BR.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WR.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square + 1:
-                                valid_king_directions[3] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[3] = valid_king_directions[4] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
-                        break
-            
-            other_square += 1 # continue down path
-        
-        # check up
-        other_square = king_square - 8
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square >= 0:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BR.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WR.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square - 8:
-                                valid_king_directions[6] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[1] = valid_king_directions[6] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
-                        break
-            
-            other_square -= 8 # continue down path
-        
-        # check down
-        other_square = king_square + 8
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square < 64:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BR.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WR.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square + 8:
-                                valid_king_directions[1] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[1] = valid_king_directions[6] = False   # take away the horizontal plane from available chess moves
-                        break
+                # if piece encountered in path is an enemy piece
+                if other_piece in attackers:
+                    if ally_square is not None:
+                        pinned_squares.append(ally_square)
                     else:
-                        break
-            
-            other_square += 8 # continue down path
-        
-        #* check bishop and queen attacks
-
-        # check upper-left
-        other_square = king_square - 9
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square >= 0 and (other_square % 8) < 7:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BB.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WB.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square - 9:
-                                valid_king_directions[7] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[0] = valid_king_directions[7] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
-                        break
-            
-            other_square -= 9 # continue down path
-        
-        # check upper-right
-        other_square = king_square - 7
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square >= 0 and (other_square % 8) > 0:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BB.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WB.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square - 7:
-                                valid_king_directions[5] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[2] = valid_king_directions[5] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
-                        break
-            
-            other_square -= 7 # continue down path
-        
-        # check lower-left
-        other_square = king_square + 7
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square < 64 and (other_square % 8) < 7:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BB.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WB.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square + 7:
-                                valid_king_directions[2] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[2] = valid_king_directions[5] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
-                        break
-            
-            other_square += 7 # continue down path
-        
-        # check lower-right
-        other_square = king_square + 9
-        ally_piece = [] # keep track of friendly pieces in this path
-        piece_path = [] # keep track of the square indexes in this path
-        while other_square < 64 and (other_square % 8) > 0:
-            piece_path.append(other_square)
-
-            # if piece encountered in path is friendly => Add to ally piece list
-            if self.is_same_color(self.board[king_square], self.board[other_square]):
-                # if this is the second piece to be added, end path here (no check or pins here)
-                if(len(ally_piece) > 0):
-                    break
-                ally_piece.append(other_square)
-            
-            # if piece encountered in path is an enemy piece
-            elif self.board[other_square] != PieceType.E.value:
-                    if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BQ.value or self.board[other_square] == PieceType.BB.value)) or\
-                    (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WQ.value or self.board[other_square] == PieceType.WB.value)):
-                        if(len(ally_piece) == 1):
-                            pinned_squares.append(ally_piece[0])
-                        else:
-                            if return_check_bool:
-                                return True
-                            in_check = True                         # king is in check
-                            check_path.extend(piece_path)           # add path from enemy piece to king for check block
-                            
-                            if other_square == king_square + 9:
-                                valid_king_directions[0] = False # Make enemy square valid if the king can take it.
-                            else:
-                                valid_king_directions[0] = valid_king_directions[7] = False   # take away the horizontal plane from available chess moves
-                        break
-                    else:
-                        break
-            
-            other_square += 9 # continue down path
+                        in_check = True                                                 # king is in check
+                        check_path.extend(BETWEEN[king_square][other_square])           # add path from enemy piece to king for check block
+                        check_path.append(other_square)
+                break
 
         #* check knight attacks
-
-        # 2-up, 1-left
-        other_square = king_square - 17
-        if other_square >= 0 and (other_square % 8) < 7:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-                    
-
-        # 1-up, 2-left
-        other_square = king_square - 10
-        if other_square >= 0 and (other_square % 8) < 6:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-        # 1-down, 2-left
-        other_square = king_square + 6
-        if other_square < 64 and (other_square % 8) < 6:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-        # 2-down, 1-left
-        other_square = king_square + 15
-        if other_square < 64 and (other_square % 8) < 7:
-           if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-            
-        # 2-up, 1-right
-        other_square = king_square - 15
-        if other_square >= 0 and (other_square % 8) > 0:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-        # 1-up, 2-right
-        other_square = king_square - 6
-        if other_square >= 0 and (other_square % 8) > 1:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-        # 1-down, 2-right
-        other_square = king_square + 10
-        if other_square < 64 and (other_square % 8) > 1:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-        # 2-down, 1-right
-        other_square = king_square + 17
-        if other_square < 64 and (other_square % 8) > 0:
-            if (self.move == Turn.White.value and (self.board[other_square] == PieceType.BN.value)) or\
-                (self.move == Turn.Black.value and (self.board[other_square] == PieceType.WN.value)):
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
+        for other_square in KNIGHT_TARGETS[king_square]:
+            if board[other_square] == enemy_knight:
+                in_check = True                         # king is in check
+                check_path.append(other_square)         # add path from enemy piece to king for check block
 
         #* check pawn attacks
+        for other_square in PAWN_CAPTURES[pawn_color][king_square]:
+            if board[other_square] == enemy_pawn:
+                in_check = True                         # king is in check
+                check_path.append(other_square)         # add path from enemy piece to king for check block
+
+        return in_check, check_path, pinned_squares
+
+    def get_attacked_squares(self, color : int, king_square : int):
+        """ Squares attacked (or defended) by color's pieces as a 64 byte map, complete on the squares next to the other
+        king on king_square. Sliders only walk rays that lead there, and see through that king so squares behind it on
+        an attacking line count as attacked.
+        """
+        board = self.board
+        attacked = bytearray(64)
+        line_rays, diagonal_rays = ZONE_LINE_RAYS[king_square], ZONE_DIAGONAL_RAYS[king_square]
+
+        for square in self.piece_squares[color]:
+            piece = board[square]
+
+            steps = STEP_ATTACKS[piece]
+            if steps is not None:
+                for other_square in steps[square]:
+                    attacked[other_square] = 1
+                continue
 
-        if self.move == Turn.White.value and king_square > 15:
-            # if white move and white king could potentially be attacked by a black pawn
-
-            if king_square % 8 != 0:
-                other_square = king_square - 9
-                if self.board[other_square] == PieceType.BP.value:
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-            
-            if king_square % 8 != 7:
-                other_square = king_square - 7
-                if self.board[other_square] == PieceType.BP.value:
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-        
-        elif self.move == Turn.Black.value and king_square < 48:
-            # if white move and white king could potentially be attacked by a black pawn
-
-            if king_square % 8 != 0:
-                other_square = king_square + 7
-                if self.board[other_square] == PieceType.WP.value:
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
-            
-            if king_square % 8 != 7:
-                other_square = king_square + 9
-                if self.board[other_square] == PieceType.WP.value:
-                    if return_check_bool:
-                        return True
-                    in_check = True                         # king is in check
-                    check_path.extend([other_square])       # add path from enemy piece to king for check block
+            if LINE_SLIDERS[piece]:
+                directions = line_rays[square] + diagonal_rays[square] if DIAGONAL_SLIDERS[piece] else line_rays[square]
+            else:
+                directions = diagonal_rays[square]
 
-        
-        if return_check_bool:
-            return in_check
-        
-        # restrict king when on edge
-        if king_square % 8 == 0:
-            valid_king_directions[0] = valid_king_directions[3] = valid_king_directions[5] = False
-        
-        if king_square % 8 == 7:
-            valid_king_directions[2] = valid_king_directions[4] = valid_king_directions[7] = False
+            for offset in directions:
+                for other_square in RAYS[offset][square]:
+                    attacked[other_square] = 1
+                    if board[other_square] != EMPTY and other_square != king_square:
+                        break
 
-        if int(king_square / 8) == 0:
-            valid_king_directions[0] = valid_king_directions[1] = valid_king_directions[2] = False
-        
-        if int(king_square / 8) == 7:
-            valid_king_directions[5] = valid_king_directions[6] = valid_king_directions[7] = False
-
-
-        other_king_val = PieceType.BK.value if self.move == Turn.White.value else PieceType.WK.value
-        for index, valid in enumerate(valid_king_directions):
-
-            if(valid):
-
-                if index == 0: #* upper-left from king square
-                    other_square = king_square - 9
-                    # up
-                    if (other_square - 8) >= 0 and self.board[other_square - 8] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-left
-                    if (other_square - 9) >= 0 and ((other_square - 9) % 8) < 7 and self.board[other_square - 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-right
-                    if (other_square - 7) >= 0 and ((other_square - 7) % 8) > 0 and self.board[other_square - 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # left
-                    if (other_square - 1) >= 0 and ((other_square - 1) % 8) < 7 and self.board[other_square - 1] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-left
-                    if (other_square + 7) < 64 and ((other_square + 7) % 8) < 7 and self.board[other_square + 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 1: #* up from king square
-                    other_square = king_square - 8
-                    # up
-                    if (other_square - 8) >= 0 and self.board[other_square - 8] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-left
-                    if (other_square - 9) >= 0 and ((other_square - 9) % 8) < 7 and self.board[other_square - 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-right
-                    if (other_square - 7) >= 0 and ((other_square - 7) % 8) > 0 and self.board[other_square - 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 2: #* upper-right from king square
-                    other_square = king_square - 7
-                    # up
-                    if (other_square - 8) >= 0 and self.board[other_square - 8] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-left
-                    if (other_square - 9) >= 0 and ((other_square - 9) % 8) < 7 and self.board[other_square - 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-right
-                    if (other_square - 7) >= 0 and ((other_square - 7) % 8) > 0 and self.board[other_square - 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # right
-                    if (other_square + 1) < 64 and ((other_square + 1) % 8) > 0 and self.board[other_square + 1] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-right
-                    if (other_square + 9) < 64 and ((other_square + 9) % 8) > 0 and self.board[other_square + 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 3: #* left from king square
-                    other_square = king_square - 1
-                    # upper-left
-                    if (other_square - 9) >= 0 and ((other_square - 9) % 8) < 7 and self.board[other_square - 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # left
-                    if (other_square - 1) >= 0 and ((other_square - 1) % 8) < 7 and self.board[other_square - 1] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-left
-                    if (other_square + 7) < 64 and ((other_square + 7) % 8) < 7 and self.board[other_square + 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 4: #* right from king square
-                    other_square = king_square + 1
-                    # upper-right
-                    if (other_square - 7) >= 0 and ((other_square - 7) % 8) > 0 and self.board[other_square - 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # right
-                    if (other_square + 1) < 64 and ((other_square + 1) % 8) > 0 and self.board[other_square + 1] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-right
-                    if (other_square + 9) < 64 and ((other_square + 9) % 8) > 0 and self.board[other_square + 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 5: #* lower-left from king square
-                    other_square = king_square + 7
-                    # upper-left
-                    if (other_square - 9) >= 0 and ((other_square - 9) % 8) < 7 and self.board[other_square - 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # left
-                    if (other_square - 1) >= 0 and ((other_square - 1) % 8) < 7 and self.board[other_square - 1] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-left
-                    if (other_square + 7) < 64 and ((other_square + 7) % 8) < 7 and self.board[other_square + 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # down
-                    if (other_square + 8) < 64 and self.board[other_square + 8] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-right
-                    if (other_square + 9) < 64 and ((other_square + 9) % 8) > 0 and self.board[other_square + 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 6: #* down from king square
-                    other_square = king_square + 8
-                    # lower-left
-                    if (other_square + 7) < 64 and ((other_square + 7) % 8) < 7 and self.board[other_square + 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # down
-                    if (other_square + 8) < 64 and self.board[other_square + 8] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-right
-                    if (other_square + 9) < 64 and ((other_square + 9) % 8) > 0 and self.board[other_square + 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
-                if index == 7: #* lower-right from king square
-                    other_square = king_square + 9
-                    # lower-left
-                    if (other_square + 7) < 64 and ((other_square + 7) % 8) < 7 and self.board[other_square + 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # down
-                    if (other_square + 8) < 64 and self.board[other_square + 8] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # lower-right
-                    if (other_square + 9) < 64 and ((other_square + 9) % 8) > 0 and self.board[other_square + 9] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # upper-right
-                    if (other_square - 7) >= 0 and ((other_square - 7) % 8) > 0 and self.board[other_square - 7] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    # right
-                    if (other_square + 1) < 64 and ((other_square + 1) % 8) > 0 and self.board[other_square + 1] == other_king_val:
-                        valid_king_directions[index] = False
-                        continue
-                    continue
+        return attacked
 
-        return in_check, check_path, pinned_squares, valid_king_directions
-        
     def get_king_moves(self):
         king_moves = []
 
-        king_square = -1
-        for index, piece in enumerate(self.board):
-            if self.move == Turn.White.value:
-                if piece == PieceType.WK.value:
-                    king_square = index
-                    break
-            elif self.move == Turn.Black.value:
-                if piece == PieceType.BK.value:
-                    king_square = index
-                    break
-            else:
-                raise Exception(self.move, "does not correlate with black or white's turn.")
-        
-        if king_square == -1:
+        if self.move != Turn.White.value and self.move != Turn.Black.value:
+            raise Exception(self.move, "does not correlate with black or white's turn.")
+
+        king_square = self.king_squares[self.move]
+        if king_square is None:
             err_msg = "King for {} not found on board.".format('white' if self.move == Turn.White.value else 'black')
             raise Exception(err_msg)
 
-        in_check, check_path, pinned_squares, valid_king_directions = self.get_checks_and_pins(king_square)
+        in_check, check_path, pinned_squares = self.get_checks_and_pins(king_square)
         double_check = False
 
         if in_check:
@@ -941,412 +706,239 @@ class ChessNode():
                         double_check = True
                         break
                     piece_found = True
-        
-        for index, safe in enumerate(valid_king_directions):
-            
-            # if moving to that square does not run into checks, add it to the king move options
-            if(safe):
-                
-                # upper-left
-                other_square = king_square - 9
-                if index == 0 and (other_square >= 0 and (other_square % 8) < 7) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-                
-                # up
-                other_square = king_square - 8
-                if index == 1 and (other_square >= 0) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-                
-                # upper-right
-                other_square = king_square - 7
-                if index == 2 and (other_square >= 0 and (other_square % 8) > 0) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-                
-                # left
-                other_square = king_square - 1
-                if index == 3 and (other_square >= 0 and (other_square % 8) < 7) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-                
-                # right
-                other_square = king_square + 1
-                if index == 4 and (other_square < 64 and (other_square % 8) > 0) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-                
-                # lower-left
-                other_square = king_square + 7
-                if index == 5 and (other_square < 64 and (other_square % 8) < 7) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-                
-                # bottom
-                other_square = king_square + 8
-                if index == 6 and (other_square < 64) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
 
-                # lower-right
-                other_square = king_square + 9
-                if index == 7 and (other_square < 64 and (other_square % 8) > 0) and not self.is_same_color(self.board[king_square], self.board[other_square]):
-                    saved_piece = self.board[other_square]
-                    self.board[other_square] = self.board[king_square]
-                    self.board[king_square] = PieceType.E.value
-                    if not self.get_checks_and_pins(other_square, return_check_bool=True):
-                        king_moves.append((king_square, other_square))
-                    self.board[king_square] = self.board[other_square]
-                    self.board[other_square] = saved_piece
-                    continue
-            
+        # squares the king could step to, the attack map is only built if there are any
+        board = self.board
+        king_color = self.move
+        targets = [other_square for other_square in KING_TARGETS[king_square] if PIECE_COLORS[board[other_square]] != king_color]
+
+        if len(targets) > 0:
+            attacked = self.get_attacked_squares(1 - king_color, king_square)
+            for other_square in targets:
+                if not attacked[other_square]:
+                    king_moves.append((king_square, other_square))
+
         return king_moves, in_check, double_check, check_path, pinned_squares
 
-    def check_axis_vertical_horizontal(self, move_list : List, current_square : int, piece : int, check_path : List[int]):
-        # check left
-        other_square = current_square - 1
-        while other_square >= 0 and (other_square % 8) < 7:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square -= 1
-                continue
-            
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square -= 1
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
+    def check_ray(self, move_list : List, current_square : int, piece : int, check_path : List[int], ray : tuple):
+        board = self.board
+        color = PIECE_COLORS[piece]
+        for other_square in ray:
+            other_piece = board[other_square]
+            if PIECE_COLORS[other_piece] == color:
                 break
-            else:
-                break
-        
-        # check right
-        other_square = current_square + 1
-        while other_square < 64 and (other_square % 8) > 0:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square += 1
+            if check_path and other_square not in check_path:
                 continue
 
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square += 1
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
-            else:
-                break
-        
-        # check up
-        other_square = current_square - 8
-        while other_square >= 0:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square -= 8
-                continue
-            
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square -= 8
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
-            else:
-                break
-        
-        # check down
-        other_square = current_square + 8
-        while other_square < 64:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square += 8
-                continue
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square += 8
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
-            else:
+            move_list.append((current_square, other_square))
+            if other_piece != EMPTY:
                 break
 
+    def check_axis_vertical_horizontal(self, move_list : List, current_square : int, piece : int, check_path : List[int]):
+        # check left, right, up, down
+        for offset in ROOK_DIRECTIONS:
+            self.check_ray(move_list, current_square, piece, check_path, RAYS[offset][current_square])
+
     def check_axis_diagonal(self,  move_list : List, current_square : int, piece : int, check_path : List[int]):
-        # check upper-left
-        other_square = current_square - 9
-        while other_square >= 0 and (other_square % 8) < 7:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square -= 9
-                continue
+        # check upper-left, upper-right, lower-left, lower-right
+        for offset in BISHOP_DIRECTIONS:
+            self.check_ray(move_list, current_square, piece, check_path, RAYS[offset][current_square])
 
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square -= 9
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
-            else:
-                break
+    def check_knight_moves(self,  move_list : List, current_square : int, piece : int, check_path : List[int]):
+        board = self.board
+        color = PIECE_COLORS[piece]
+        for other_square in KNIGHT_TARGETS[current_square]:
+            if len(check_path) == 0 or other_square in check_path:
+                if PIECE_COLORS[board[other_square]] != color:
+                    move_list.append((current_square, other_square))
         
-        # check upper-right
-        other_square = current_square - 7
-        while other_square >= 0 and (other_square % 8) > 0:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square -= 7
-                continue
+    def check_pawn_moves(self,  move_list : List, current_square : int, piece : int, check_path : List[int]):
 
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square -= 7
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
-            else:
-                break
+        board = self.board
+        if piece == PieceType.WP.value:
+            color = Turn.White.value
+            promotions = (PieceType.WQ.value, PieceType.WR.value, PieceType.WB.value, PieceType.WN.value)
+        elif piece == PieceType.BP.value:
+            color = Turn.Black.value
+            promotions = (PieceType.BQ.value, PieceType.BR.value, PieceType.BB.value, PieceType.BN.value)
+        else:
+            return
+
+        pushes = PAWN_PUSHES[color][current_square]
+
+        # forward one square, or two from the starting row
+        if len(pushes) > 0 and board[pushes[0]] == PieceType.E.value:
+            if len(check_path) == 0 or (pushes[0] in check_path):
+                self.add_pawn_move(move_list, current_square, pushes[0], promotions)
+
+            if len(pushes) == 2 and board[pushes[1]] == PieceType.E.value:
+                if len(check_path) == 0 or (pushes[1] in check_path):
+                    move_list.append((current_square, pushes[1]))
+
+        # check if can take at diagonal
+        for other_square in PAWN_CAPTURES[color][current_square]:
+            if board[other_square] != PieceType.E.value and not self.is_same_color(piece, board[other_square]):
+                if len(check_path) == 0 or (other_square in check_path):
+                    self.add_pawn_move(move_list, current_square, other_square, promotions)
+
+    def add_pawn_move(self, move_list : List, current_square : int, other_square : int, promotions : tuple):
+        if other_square < 8 or other_square >= 56:
+            # add third value is this pawn move will result in promotion
+            for promotion in promotions:
+                move_list.append((current_square, other_square, promotion))
+        else:
+            move_list.append((current_square, other_square))
+
+    def get_piece_moves(self, move_list : List, current_square : int, piece : int, check_path : List[int]):
+        """ Adds the moves of the (non-king) piece on current_square to move_list
+        """
+        #* CURRENT PIECE: ROOK OR QUEEN (a queen's lines come before its diagonals)
+        if LINE_SLIDERS[piece]:
+            self.check_axis_vertical_horizontal(move_list, current_square, piece, check_path)
+            if DIAGONAL_SLIDERS[piece]:
+                self.check_axis_diagonal(move_list, current_square, piece, check_path)
+        
+        #* CURRENT PIECE: BISHOP
+        elif DIAGONAL_SLIDERS[piece]:
+            self.check_axis_diagonal(move_list, current_square, piece, check_path)
+        
+        #* CURRENT PIECE: KNIGHT
+        elif piece in KNIGHT_PIECES:
+            self.check_knight_moves(move_list, current_square, piece, check_path)
+        
+        #* CURRENT PIECE: PAWN
+        elif piece in PAWN_PIECES:
+            self.check_pawn_moves(move_list, current_square, piece, check_path)
+
+    def get_board_moves(self, current_move : int):
+        """ Generates legal moves from the list board and piece lists, returns the move list and whether in check
+        """
+        legal_moves, in_check, double_check, check_path, pinned_squares = self.get_king_moves()
+
+        # if double check, only king moves
+        if double_check:
+            return legal_moves, in_check
         
-        # check lower-left
-        other_square = current_square + 7
-        while other_square < 64 and (other_square % 8) < 7:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square += 7
+        # check the rest of the side to move's pieces
+        board = self.board
+        for current_square in self.piece_squares[current_move]:
+            
+            if current_square in pinned_squares:
                 continue
 
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square += 7
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
-            else:
-                break
-        
-        # check lower-right
-        other_square = current_square + 9
-        while other_square < 64 and (other_square % 8) > 0:
-            if self.is_same_color(piece, self.board[other_square]):
-                break
-            if len(check_path) > 0 and other_square not in check_path:
-                other_square += 9
+            self.get_piece_moves(legal_moves, current_square, board[current_square], check_path)
+
+        return legal_moves, in_check
+
+    def get_base_moves(self, current_move : int):
+        """ Cached move list of the grandparent (the nearest position with the same side to move) without its king moves,
+        and the squares whose contents differ from it. None if it has no cached list or board, or was in check.
+        """
+        if self.parent is None or self.parent.parent is None or current_move != self.move:
+            return None
+
+        base = self.parent.parent
+        if base.legal_moves_cache is None or base.board is None or base.move != current_move:
+            return None
+
+        # its moves were limited to answering the check
+        base_list = base.legal_moves_cache
+        if type(base_list) is CheckMoves:
+            return None
+
+        # king moves come first, then the other pieces' by ascending square
+        base_king = base.king_squares[current_move]
+        start = 0
+        while start < len(base_list) and base_list[start][0] == base_king:
+            start += 1
+
+        # the squares the two moves touched, unless the nodes hang under other moves (transpositions), then the boards are compared
+        parent = self.parent
+        if base._children is not None and parent._children is not None and base._children.get(parent.last_move) is parent and parent._children.get(self.last_move) is self:
+            changed = (parent.last_move[0], parent.last_move[1], self.last_move[0], self.last_move[1])
+        else:
+            board = self.board
+            changed = [square for square, piece in enumerate(base.board) if board[square] != piece]
+        return base_list, start, changed
+
+    def moves_depend_on(self, current_square : int, piece : int, squares : List[int]):
+        """ True if a change on any of squares can change the moves of the piece on current_square (when not in check or pinned)
+        """
+        if LINE_SLIDERS[piece] or DIAGONAL_SLIDERS[piece]:
+            directions = DIRECTION[current_square]
+            for square in squares:
+                offset = directions[square]
+                if offset != 0 and ((LINE_SLIDERS[piece] and offset in ROOK_DIRECTIONS) or (DIAGONAL_SLIDERS[piece] and offset in BISHOP_DIRECTIONS)):
+                    return True
+            return False
+
+        reach = STEP_REACH[piece][current_square]
+        for square in squares:
+            if square in reach:
+                return True
+        return False
+
+    def get_incremental_moves(self, current_move : int):
+        """ get_board_moves, reusing the grandparent's moves for pieces the last two moves cannot have affected
+
+        The king's moves, checks and pins are always worked out again. A piece is regenerated if its square changed, a
+        changed square lies on its lines (or steps, for knights and pawns), or the grandparent has no moves from its square.
+        """
+        base_moves = self.get_base_moves(current_move)
+        if base_moves is None:
+            return self.get_board_moves(current_move)
+        base_list, index, changed = base_moves
+        base_length = len(base_list)
+
+        legal_moves, in_check, double_check, check_path, pinned_squares = self.get_king_moves()
+        if double_check:
+            return legal_moves, in_check
+
+        board = self.board
+        king_square = self.king_squares[current_move]
+        for current_square in self.piece_squares[current_move]:
+
+            if current_square in pinned_squares or current_square == king_square:
                 continue
 
-            if self.board[other_square] == PieceType.E.value:
-                move_list.append((current_square, other_square))
-                other_square += 9
-            elif not self.is_same_color(piece, self.board[other_square]):
-                move_list.append((current_square, other_square))
-                break
+            piece = board[current_square]
+
+            # the grandparent's moves from this square
+            while index < base_length and base_list[index][0] < current_square:
+                index += 1
+            end = index
+            while end < base_length and base_list[end][0] == current_square:
+                end += 1
+
+            if end > index and not in_check and current_square not in changed and not self.moves_depend_on(current_square, piece, changed):
+                legal_moves.extend(base_list[index:end])
             else:
-                break
+                self.get_piece_moves(legal_moves, current_square, piece, check_path)
 
-    def check_knight_moves(self,  move_list : List, current_square : int, piece : int, check_path : List[int]):
-        # 2-up, 1-left
-        other_square = current_square - 17
-        if other_square >= 0 and (other_square % 8) < 7:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
+        return legal_moves, in_check
 
-        # 1-up, 2-left
-        other_square = current_square - 10
-        if other_square >= 0 and (other_square % 8) < 6:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
-        
-        # 1-down, 2-left
-        other_square = current_square + 6
-        if other_square < 64 and (other_square % 8) < 6:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
-            
-        # 2-down, 1-left
-        other_square = current_square + 15
-        if other_square < 64 and (other_square % 8) < 7:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
-            
-        # 2-up, 1-right
-        other_square = current_square - 15
-        if other_square >= 0 and (other_square % 8) > 0:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
-            
-        # 1-up, 2-right
-        other_square = current_square - 6
-        if other_square >= 0 and (other_square % 8) > 1:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
+    def generate_legal_moves(self, current_move : int):
+        """ Runs the move generator, without caching or updating the state evaluation
+        """
+        if self.board is None:
+            self.restore_position()
 
-        # 1-down, 2-right
-        other_square = current_square + 10
-        if other_square < 64 and (other_square % 8) > 1:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
-            
-        # 2-down, 1-right
-        other_square = current_square + 17
-        if other_square < 64 and (other_square % 8) > 0:
-            if len(check_path) == 0 or other_square in check_path:
-                if self.board[other_square] == PieceType.E.value or not self.is_same_color(piece, self.board[other_square]):
-                    move_list.append((current_square, other_square))
-        
-    def check_pawn_moves(self,  move_list : List, current_square : int, piece : int, check_path : List[int]):
-        
-        # check if black pawn
-        if piece == PieceType.BP.value:
-            if int(current_square / 8) == 1:
-                # black pawn can make two forward moves (first move)
-                if self.board[current_square + 8] == PieceType.E.value:
-                    if len(check_path) == 0 or (current_square + 8 in check_path):
-                        move_list.append((current_square, current_square + 8))
-                    
-                    if self.board[current_square + 16] == PieceType.E.value:
-                        if len(check_path) == 0 or (current_square + 16 in check_path):
-                            move_list.append((current_square, current_square + 16))
-            else:
-                # black pawn can only move forward one square
-                if self.board[current_square + 8] == PieceType.E.value:
-                    if len(check_path) == 0 or (current_square + 8 in check_path):
-                        if current_square + 8 >= 56:
-                            # add third value is this pawn move will result in promotion
-                            move_list.append((current_square, current_square + 8, PieceType.BQ.value))
-                            move_list.append((current_square, current_square + 8, PieceType.BR.value))
-                            move_list.append((current_square, current_square + 8, PieceType.BB.value))
-                            move_list.append((current_square, current_square + 8, PieceType.BN.value))
-                        else:
-                            move_list.append((current_square, current_square + 8))
-
-            # check if can take at diagonal
-            if current_square % 8 > 0 and self.board[current_square + 7] != PieceType.E.value and not self.is_same_color(piece, self.board[current_square + 7]):
-                if len(check_path) == 0 or (current_square + 7 in check_path):
-                    
-                    if current_square + 7 >= 56:
-                            # add third value is this pawn move will result in promotion
-                            move_list.append((current_square, current_square + 7, PieceType.BQ.value))
-                            move_list.append((current_square, current_square + 7, PieceType.BR.value))
-                            move_list.append((current_square, current_square + 7, PieceType.BB.value))
-                            move_list.append((current_square, current_square + 7, PieceType.BN.value))
-                    else:
-                        move_list.append((current_square, current_square + 7))
+        if self.bitboard is not None:
+            return self.bitboard.get_legal_moves(current_move)
 
+        if ChessNode.incremental_moves:
+            legal_moves, in_check = self.get_incremental_moves(current_move)
+            if ChessNode.verify_incremental_moves:
+                full_moves, full_in_check = self.get_board_moves(current_move)
+                if legal_moves != full_moves or in_check != full_in_check:
+                    raise Exception("Incremental moves {} do not match full generation {}.".format(legal_moves, full_moves))
+            return legal_moves, in_check
 
-            
-            if current_square % 8 < 7 and self.board[current_square + 9] != PieceType.E.value and not self.is_same_color(piece, self.board[current_square + 9]):
-                if len(check_path) == 0 or (current_square + 9 in check_path):
-                    if current_square + 9 >= 56:
-                            # add third value is this pawn move will result in promotion
-                            move_list.append((current_square, current_square + 9, PieceType.BQ.value))
-                            move_list.append((current_square, current_square + 9, PieceType.BR.value))
-                            move_list.append((current_square, current_square + 9, PieceType.BB.value))
-                            move_list.append((current_square, current_square + 9, PieceType.BN.value))
-                    else:
-                        move_list.append((current_square, current_square + 9))
-
-        # check if white pawn
-        elif piece == PieceType.WP.value:
-            if int(current_square / 8) == 6:
-                # black pawn can make two forward moves (first move)
-                if self.board[current_square - 8] == PieceType.E.value:
-                    if len(check_path) == 0 or (current_square - 8 in check_path):
-                        move_list.append((current_square, current_square - 8))
-                    
-                    if self.board[current_square - 16] == PieceType.E.value:
-                        if len(check_path) == 0 or (current_square - 16 in check_path):
-                            move_list.append((current_square, current_square - 16))
-            else:
-                # black pawn can only move forward one square
-                if self.board[current_square - 8] == PieceType.E.value:
-                    if len(check_path) == 0 or (current_square - 8 in check_path):
-                        if current_square - 8 < 8:
-                            # add third value is this pawn move will result in promotion
-                            move_list.append((current_square, current_square - 8, PieceType.WQ.value))
-                            move_list.append((current_square, current_square - 8, PieceType.WR.value))
-                            move_list.append((current_square, current_square - 8, PieceType.WB.value))
-                            move_list.append((current_square, current_square - 8, PieceType.WN.value))
-                        else:
-                            move_list.append((current_square, current_square - 8))
-
-            # check if can take at diagonal
-            if current_square % 8 < 7 and self.board[current_square - 7] != PieceType.E.value and not self.is_same_color(piece, self.board[current_square - 7]):
-                if len(check_path) == 0 or (current_square - 7 in check_path):
-                    if current_square - 7 < 8:
-                            # add third value is this pawn move will result in promotion
-                            move_list.append((current_square, current_square - 7, PieceType.WQ.value))
-                            move_list.append((current_square, current_square - 7, PieceType.WR.value))
-                            move_list.append((current_square, current_square - 7, PieceType.WB.value))
-                            move_list.append((current_square, current_square - 7, PieceType.WN.value))
-                    else:
-                        move_list.append((current_square, current_square - 7))
-            
-            if current_square % 8 > 0 and self.board[current_square - 9] != PieceType.E.value and not self.is_same_color(piece, self.board[current_square - 9]):
-                if len(check_path) == 0 or (current_square - 9 in check_path):
-                    if current_square - 9 < 8:
-                            # add third value is this pawn move will result in promotion
-                            move_list.append((current_square, current_square - 9, PieceType.WQ.value))
-                            move_list.append((current_square, current_square - 9, PieceType.WR.value))
-                            move_list.append((current_square, current_square - 9, PieceType.WB.value))
-                            move_list.append((current_square, current_square - 9, PieceType.WN.value))
-                    else:
-                        move_list.append((current_square, current_square - 9))
+        return self.get_board_moves(current_move)
 
     def get_legal_moves(self, current_move=None, chess_syntax=False):
+        """ Legal moves for the side to move, the list is cached on the node so treat it as read-only
+        """
 
         if self.state_evaluation != StateEvaluation.PLAY.value:
             return []
@@ -1354,81 +946,55 @@ class ChessNode():
         if current_move is None:
             current_move = self.move
         
-        legal_moves, in_check, double_check, check_path, pinned_squares = self.get_king_moves()
-
-        # if double check, only king moves
-        if double_check:
-            if chess_syntax:
-                return [(self.board_index_to_square(x), self.board_index_to_square(y)) for x, y in legal_moves]
-            return legal_moves
-        
-        # check the rest of the pieces
-        for current_square, piece in enumerate(self.board):
-            
-            if current_square in pinned_squares:
-                continue
+        if current_move == self.move and self.legal_moves_cache is not None:
+            legal_moves = self.legal_moves_cache
+        else:
+            legal_moves, in_check = self.generate_legal_moves(current_move)
 
-            # White to Move
-            if current_move == Turn.White.value:
+            if len(legal_moves) == 0:
+                if in_check:
+                    self.state_evaluation = StateEvaluation.CHECKMATE.value
 
-                #* CURRENT PIECE: ROOK
-                if piece == PieceType.WR.value:
-                    self.check_axis_vertical_horizontal(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: BISHOP
-                if piece == PieceType.WB.value:
-                    self.check_axis_diagonal(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: QUEEN
-                if piece == PieceType.WQ.value:
-                    self.check_axis_vertical_horizontal(legal_moves, current_square, piece, check_path)
-                    self.check_axis_diagonal(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: KNIGHT
-                if piece == PieceType.WN.value:
-                    self.check_knight_moves(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: PAWN
-                if piece == PieceType.WP.value:
-                    self.check_pawn_moves(legal_moves, current_square, piece, check_path)
-            # Black to Move
-            elif current_move == Turn.Black.value:
-                #* CURRENT PIECE: ROOK
-                if piece == PieceType.BR.value:
-                    self.check_axis_vertical_horizontal(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: BISHOP
-                if piece == PieceType.BB.value:
-                    self.check_axis_diagonal(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: QUEEN
-                if piece == PieceType.BQ.value:
-                    self.check_axis_vertical_horizontal(legal_moves, current_square, piece, check_path)
-                    self.check_axis_diagonal(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: KNIGHT
-                if piece == PieceType.BN.value:
-                    self.check_knight_moves(legal_moves, current_square, piece, check_path)
-                
-                #* CURRENT PIECE: PAWN
-                if piece == PieceType.BP.value:
-                    self.check_pawn_moves(legal_moves, current_square, piece, check_path)
-
-        if len(legal_moves) == 0:
-            if in_check:
-                self.state_evaluation = StateEvaluation.CHECKMATE.value
+                    if self.move == Turn.White.value:
+                        self.backpropogate_results(1) # black won, 1 is index for black's win tally
+                    else:
+                        self.backpropogate_results(0) # white won, 0 is index for white's win tally
 
-                if self.move == Turn.White.value:
-                    self.backpropogate_results(1) # black won, 1 is index for black's win tally
                 else:
-                    self.backpropogate_results(0) # white won, 0 is index for white's win tally
-
-            else:
-                self.state_evaluation = StateEvaluation.STALEMATE.value
-                self.backpropogate_results(2) # 2 is draw/stalemate tally index
-
+                    self.state_evaluation = StateEvaluation.STALEMATE.value
+                    self.backpropogate_results(2) # 2 is draw/stalemate tally index
+            
+            elif current_move == self.move and ChessNode.move_cache_enabled:
+                if in_check:
+                    legal_moves = CheckMoves(legal_moves)
+                self.cache_legal_moves(legal_moves)
 
         if chess_syntax:
             return [(self.board_index_to_square(xyz[0]), self.board_index_to_square(xyz[1])) if len(xyz) == 2 else (self.board_index_to_square(xyz[0]), self.board_index_to_square(xyz[1]), xyz[2])  for xyz in legal_moves]
 
         return legal_moves
+
+    def cache_legal_moves(self, legal_moves : List[tuple]):
+        self.legal_moves_cache = legal_moves
+
+        # with a limit set, the oldest cached lists are dropped first
+        if ChessNode.move_cache_limit is not None:
+            cached_nodes = ChessNode.move_cache_order
+            cached_nodes.append(self)
+            while len(cached_nodes) > ChessNode.move_cache_limit:
+                cached_nodes.popleft().legal_moves_cache = None
+
+    def clear_legal_moves_cache(self):
+        self.legal_moves_cache = None
+
+    def get_mobility(self, color : int):
+        """ Number of legal moves color would have if it were its turn, leaves the node untouched
+        """
+        saved_move = self.move
+        self.move = color
+        try:
+            legal_moves, _ = self.generate_legal_moves(color)
+        finally:
+            self.move = saved_move
+        
+        return len(legal_moves)
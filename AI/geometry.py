@@ -0,0 +1,149 @@
+#* board offsets for the 8 directions, in the order king moves are listed
+UPPER_LEFT, UP, UPPER_RIGHT, LEFT, RIGHT, LOWER_LEFT, DOWN, LOWER_RIGHT = -9, -8, -7, -1, 1, 7, 8, 9
+
+KING_DIRECTIONS = (UPPER_LEFT, UP, UPPER_RIGHT, LEFT, RIGHT, LOWER_LEFT, DOWN, LOWER_RIGHT)
+ROOK_DIRECTIONS = (LEFT, RIGHT, UP, DOWN)
+BISHOP_DIRECTIONS = (UPPER_LEFT, UPPER_RIGHT, LOWER_LEFT, LOWER_RIGHT)
+
+# (row step, col step) of each direction
+DIRECTION_STEPS = {
+    UPPER_LEFT: (-1, -1), UP: (-1, 0), UPPER_RIGHT: (-1, 1), LEFT: (0, -1),
+    RIGHT: (0, 1), LOWER_LEFT: (1, -1), DOWN: (1, 0), LOWER_RIGHT: (1, 1),
+}
+
+# 2-up 1-left, 1-up 2-left, 1-down 2-left, 2-down 1-left, then the same to the right
+KNIGHT_STEPS = ((-2, -1), (-1, -2), (1, -2), (2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1))
+
+WHITE, BLACK = 0, 1
+
+
+def _on_board(row : int, col : int):
+    return 0 <= row < 8 and 0 <= col < 8
+
+def _build_rays():
+    rays = {}
+    for offset, (row_step, col_step) in DIRECTION_STEPS.items():
+        squares = []
+        for square in range(64):
+            ray = []
+            row, col = square // 8 + row_step, square % 8 + col_step
+            while _on_board(row, col):
+                ray.append(row * 8 + col)
+                row, col = row + row_step, col + col_step
+            squares.append(tuple(ray))
+        rays[offset] = tuple(squares)
+    return rays
+
+def _build_steps(steps):
+    targets = []
+    for square in range(64):
+        row, col = square // 8, square % 8
+        targets.append(tuple((row + r) * 8 + col + c for r, c in steps if _on_board(row + r, col + c)))
+    return tuple(targets)
+
+def _build_pawn_pushes(color : int):
+    pushes = []
+    for square in range(64):
+        row = square // 8
+        if color == WHITE:
+            push = (square - 8, square - 16) if row == 6 else (square - 8,) if row > 0 else ()
+        else:
+            push = (square + 8, square + 16) if row == 1 else (square + 8,) if row < 7 else ()
+        pushes.append(push)
+    return tuple(pushes)
+
+def _build_zone_rays(rays, king_targets):
+    line_rays = []
+    diagonal_rays = []
+    for king_square in range(64):
+        zone = set(king_targets[king_square])
+        lines, diagonals = [], []
+        for square in range(64):
+            reaching = [offset for offset, squares in rays.items() if zone.intersection(squares[square])]
+            lines.append(tuple(offset for offset in ROOK_DIRECTIONS if offset in reaching))
+            diagonals.append(tuple(offset for offset in BISHOP_DIRECTIONS if offset in reaching))
+        line_rays.append(tuple(lines))
+        diagonal_rays.append(tuple(diagonals))
+    return tuple(line_rays), tuple(diagonal_rays)
+
+def _build_lines(rays):
+    between = [[()] * 64 for _ in range(64)]
+    line = [[()] * 64 for _ in range(64)]
+    direction = [[0] * 64 for _ in range(64)]
+    for offset, squares in rays.items():
+        for square in range(64):
+            full_line = tuple(sorted(rays[-offset][square] + (square,) + squares[square]))
+            for index, other_square in enumerate(squares[square]):
+                between[square][other_square] = squares[square][:index]
+                line[square][other_square] = full_line
+                direction[square][other_square] = offset
+    return tuple(map(tuple, between)), tuple(map(tuple, line)), tuple(map(tuple, direction))
+
+
+# RAYS[offset][square]: squares walked from square towards the board edge, nearest first
+RAYS = _build_rays()
+
+# targets in the order the move generators have always listed them
+KNIGHT_TARGETS = _build_steps(KNIGHT_STEPS)
+KING_TARGETS = _build_steps([DIRECTION_STEPS[offset] for offset in KING_DIRECTIONS])
+
+# PAWN_PUSHES[color][square]: single push, then the double push from the starting row
+PAWN_PUSHES = (_build_pawn_pushes(WHITE), _build_pawn_pushes(BLACK))
+
+# PAWN_CAPTURES[color][square]: diagonals a pawn takes on (also where an enemy pawn checks a king from)
+PAWN_CAPTURES = (_build_steps([(-1, 1), (-1, -1)]), _build_steps([(1, -1), (1, 1)]))
+
+# BETWEEN[a][b]: squares strictly between a and b walking from a, LINE[a][b]: the whole board line through both,
+# DIRECTION[a][b]: offset to step from a towards b (all empty / 0 when a and b do not share a line)
+BETWEEN, LINE, DIRECTION = _build_lines(RAYS)
+
+# ZONE_LINE_RAYS[king][square], ZONE_DIAGONAL_RAYS[king][square]: rook / bishop offsets whose ray from square passes one
+# of the squares next to king, the only rays an attack map for king moves has to walk
+ZONE_LINE_RAYS, ZONE_DIAGONAL_RAYS = _build_zone_rays(RAYS, KING_TARGETS)
+
+
+if __name__ == '__main__':
+    # micro-benchmark: walking every ray on a list board with edge arithmetic vs the precomputed tables
+    import timeit
+    from chess_node import ChessNode
+
+    board = ChessNode.get_starting_board()
+    board[36] = board[52]   # open up some lines
+    board[52] = 0
+
+    def walk_arithmetic():
+        found = 0
+        for square in range(64):
+            for offset in (-9, -8, -7, -1, 1, 7, 8, 9):
+                other_square = square + offset
+                while 0 <= other_square < 64:
+                    if offset in (-9, -1, 7) and other_square % 8 == 7:
+                        break
+                    if offset in (-7, 1, 9) and other_square % 8 == 0:
+                        break
+                    if board[other_square] != 0:
+                        found += 1
+                        break
+                    other_square += offset
+        return found
+
+    def walk_tables():
+        found = 0
+        for square in range(64):
+            for offset in KING_DIRECTIONS:
+                for other_square in RAYS[offset][square]:
+                    if board[other_square] != 0:
+                        found += 1
+                        break
+        return found
+
+    assert walk_arithmetic() == walk_tables()
+
+    setup = timeit.timeit('_build_rays(); _build_lines(_build_rays())', globals=globals(), number=5) / 5
+    arithmetic = min(timeit.repeat(walk_arithmetic, number=200, repeat=5)) / 200
+    tables = min(timeit.repeat(walk_tables, number=200, repeat=5)) / 200
+
+    print("Table build time:   {:.1f} ms".format(setup * 1000))
+    print("Arithmetic walk:    {:.1f} us per board".format(arithmetic * 1e6))
+    print("Table walk:         {:.1f} us per board".format(tables * 1e6))
+    print("Speedup:            {:.2f}x".format(arithmetic / tables))
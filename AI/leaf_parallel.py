@@ -0,0 +1,122 @@
+from chess_node import *
+from mcts import mcts
+from rollout import Rollout
+
+import os
+import sys
+import random
+import multiprocessing
+
+
+def simulate(position : ChessNode, seed : int):
+    """ Rollout of one leaf in a worker process, returns the stats index of the result and the number of plies played
+    """
+    random.seed(seed)
+    rollout = Rollout(position, random_move_odds=4)
+    return rollout.play(), rollout.plies
+
+
+class LeafParallelSearch():
+    """ Leaf parallelization: selection and expansion stay in this process, rollouts of the new leaves run in a pool of
+    worker processes
+
+    While a leaf is being simulated every node on its path carries virtual_loss results counted against it, so the next
+    selections spread over other paths. They are taken back when the real result is backpropagated.
+    """
+
+    def __init__(self, tree : mcts, workers : int = None, in_flight : int = None, virtual_loss : int = 1, seed : int = None):
+        self.tree = tree
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.in_flight = in_flight if in_flight is not None else 2 * self.workers
+        self.virtual_loss = virtual_loss
+
+        # rollout i plays with seed + i
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rollouts = 0
+
+        self.pool = multiprocessing.Pool(self.workers)
+
+    def add_virtual_loss(self, path : List[ChessNode], amount : int):
+        for node in path:
+            # selection scores a child by the results of its side to move, so a loss is a win for the other side
+            if node.move == Turn.White.value:
+                node.black_wins += amount
+            else:
+                node.white_wins += amount
+
+    def run(self, iterations : int):
+        """ Runs iterations search iterations, applying rollout results as they complete
+        """
+        tree = self.tree
+        profiler = tree.profiler
+        pending = [] # (rollout, game path, node path) of the leaves being simulated
+        started = 0
+
+        while started < iterations or len(pending) > 0:
+            while started < iterations and len(pending) < self.in_flight:
+                if profiler is not None:
+                    profiler.enter('selection')
+                new_leaf_node = tree.select_leaf(new_game=True)
+                started += 1
+
+                if new_leaf_node is None:
+                    self.finish_iteration(pending) # the game ended inside the tree, already counted
+                    continue
+
+                path = [tree.root]
+                for chessMove in tree.game_path:
+                    path.append(path[-1].get_child(chessMove))
+
+                self.add_virtual_loss(path, self.virtual_loss)
+                pending.append((self.pool.apply_async(simulate, (new_leaf_node.copy(), self.seed + self.rollouts)), list(tree.game_path), path))
+                self.rollouts += 1
+
+            if len(pending) == 0:
+                continue
+
+            # the first rollout that has finished, or the oldest one
+            if profiler is not None:
+                profiler.enter('simulation')
+            finished = next((index for index, (rollout, _, _) in enumerate(pending) if rollout.ready()), 0)
+            rollout, game_path, path = pending.pop(finished)
+            result, plies = rollout.get()
+
+            if profiler is not None:
+                profiler.record_rollout(plies)
+                profiler.enter('backpropagation')
+            self.add_virtual_loss(path, -self.virtual_loss)
+
+            # shared nodes report back along the path they were selected through
+            for parent, child in zip(path, path[1:]):
+                child.parent = parent
+            path[-1].backpropogate_results(result)
+
+            # the finished iteration is the tree's game path while it is journaled
+            tree.current, tree.game_path = path[-1], game_path
+            self.finish_iteration(pending)
+
+        tree.reset_current()
+
+    def finish_iteration(self, pending : list):
+        """ The tree's steps after an iteration (journal, node budget) for its current game path, with the virtual loss
+        of the pending leaves taken out of the statistics while they run
+        """
+        in_flight = [path for _, _, path in pending]
+        for path in in_flight:
+            self.add_virtual_loss(path, -self.virtual_loss)
+
+        self.tree.finish_iteration(in_flight)
+
+        for path in in_flight:
+            self.add_virtual_loss(path, self.virtual_loss)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+if __name__ == '__main__':
+    from benchmark import worker_scaling
+
+    # python leaf_parallel.py [iterations]
+    worker_scaling(lambda tree, workers: LeafParallelSearch(tree, workers=workers, seed=0), int(sys.argv[1]) if len(sys.argv) > 1 else 200)
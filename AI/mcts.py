@@ -1,14 +1,22 @@
 from chess_node import *
 from naive_bot import NaiveBot
+from rollout import Rollout
+from uct import uct_select
+import tree_file
+import tree_stats
 
 import os
 import sys
+from collections import OrderedDict
 import random
 import pickle
 from pathlib import Path
 import datetime
+import time
+import json
 import traceback
-import math
+
+import numpy as np
 
 clear = lambda: os.system('cls')
 
@@ -19,29 +27,86 @@ sys.setrecursionlimit(recursion_limit)
 # find or create directory to save objects through pickle
 default_save_dir = Path(os.path.realpath(os.path.dirname(__file__))).absolute().joinpath('model')
 
+# trees are saved in the binary tree format, names ending in .obj are pickled instead
+default_tree_name = 'mcts_tree.tree'
+
+def journal_file(tree_file):
+    return str(tree_file) + '.journal'
+
 class mcts():
 
+    # SearchProfiler timing the search phases, searches skip the timing while this is None
+    profiler = None
+
+    # node budget, see set_node_budget
+    max_nodes = None
+
+    # write the optional board section in saved tree files (see tree_file.write_tree), kept from the file loaded
+    save_boards = False
+
+    # moves committed with commit_move, from the position the tree was started from to the current root
+    played_moves = ()
+
+    # nodes added by the search so far, and set by stop_search to end a running search() after its current iteration
+    nodes_created = 0
+    stop_requested = False
+
     def __new__(cls, import_tree_file=None, *args, **kwargs):
         if import_tree_file is not None:
-            with open(import_tree_file, 'rb') as ifile:
-                inst = pickle.load(ifile)
+            if tree_file.is_tree_file(import_tree_file):
+                inst = super(mcts, cls).__new__(cls)
+                inst.load_tree_file(import_tree_file, lazy_load=kwargs.get('lazy_load', False), max_hydrated=kwargs.get('max_hydrated'))
+            else:
+                with open(import_tree_file, 'rb') as ifile:
+                    inst = tree_file.LegacyUnpickler(ifile).load()
+
+                    if not isinstance(inst, cls):
+                        raise TypeError('Unpickled object is not of type {}'.format(cls))
+                # the pickled path may be from another system, saves go back next to the file
+                inst.save_dir = Path(import_tree_file).absolute().parent
+
+            inst.autosave = kwargs.get('autosave', True)
 
-                if not isinstance(inst, cls):
-                    raise TypeError('Unpickled object is not of type {}'.format(cls))
+            # iterations journaled since this snapshot was written
+            inst.replay_journal(journal_file(import_tree_file))
+
+            if kwargs.get('max_nodes') is not None:
+                inst.set_node_budget(kwargs['max_nodes'], evict_batch=kwargs.get('evict_batch', 256))
         
         else:
-            inst = super(mcts, cls).__new__(cls, *args, **kwargs)
+            inst = super(mcts, cls).__new__(cls)
         return inst
     
-    def __init__(self, import_tree_file : str = None, save_dir=None):
+    def __init__(self, import_tree_file : str = None, save_dir=None, use_bitboard : bool = False, use_transpositions : bool = False, snapshot_interval : int = None, compact_every : int = 1000,
+                 lazy_load : bool = False, max_hydrated : int = None, autosave : bool = True, max_nodes : int = None, evict_batch : int = 256):
 
         if import_tree_file is not None:
             # __new__() should have already been called
             return 
             
-        self.root = ChessNode()
+        self.root = ChessNode(use_bitboard=use_bitboard)
         self.current = self.root
         self.game_path = []
+
+        # set when the tree is loaded with lazy_load, see load_tree_file
+        self.lazy_tree = None
+
+        # searches save (journal) every iteration unless turned off, e.g. for trees that only live in a worker process
+        self.autosave = autosave
+
+        # optional transposition table: (zobrist hash, ply) -> node, so move orders reaching the same
+        # position share one node. Keying on ply as well keeps the tree acyclic.
+        self.transpositions = None
+        if use_transpositions:
+            self.transpositions = {(self.root.zobrist_hash, 0): self.root}
+
+        # optional board-less nodes: once the search moves off a node it keeps its board only if its ply is a multiple
+        # of snapshot_interval (the root always does), other positions are replayed from the nearest snapshot on demand
+        self.snapshot_interval = snapshot_interval
+
+        # iterations are appended to a journal next to the saved tree, which is rewritten in full every compact_every records
+        self.compact_every = compact_every
+        self.journal_records = 0
         
         if save_dir is None:
             self.save_dir = default_save_dir
@@ -51,24 +116,407 @@ class mcts():
         if not self.save_dir.exists():
             self.save_dir.mkdir()
 
+        if max_nodes is not None:
+            self.set_node_budget(max_nodes, evict_batch=evict_batch)
+
+    def __setstate__(self, state):
+        # trees pickled before these settings existed load as a tree that does not use them
+        self.lazy_tree = None
+        self.autosave = True
+        self.transpositions = None
+        self.snapshot_interval = None
+        self.compact_every = 1000
+        self.journal_records = 0
+        self.__dict__.update(state)
+
+    def load_tree_file(self, import_tree_file : str, lazy_load : bool = False, max_hydrated : int = None):
+        """ Sets up the tree from a file in the binary tree format, saves go back to the same directory
+
+        With lazy_load only the root is read, children are read from the file the first time the search descends into
+        them, and at most max_hydrated nodes keep theirs read in. Full saves copy what is still on disk without reading it in.
+        """
+        saved_tree = tree_file.TreeFile(import_tree_file)
+
+        self.lazy_tree = None
+        if lazy_load:
+            # the table only holds the nodes read in so far
+            self.transpositions = {} if saved_tree.flags & tree_file.FLAG_TRANSPOSITIONS else None
+            self.lazy_tree = tree_file.LazyTree(saved_tree, max_hydrated=max_hydrated, transpositions=self.transpositions)
+            self.root = self.lazy_tree.root_node()
+        else:
+            self.root, self.transpositions = saved_tree.build_tree()
+        self.current = self.root
+        self.game_path = []
+        self.snapshot_interval = saved_tree.snapshot_interval
+        self.compact_every = saved_tree.compact_every
+        self.save_boards = saved_tree.boards is not None
+        self.journal_records = 0
+        self.save_dir = Path(import_tree_file).absolute().parent
+
     def reset_current(self):
+        if self.snapshot_interval is not None:
+            self.release_position_behind(self.current, len(self.game_path))
+
         self.current = self.root
         self.game_path = []
 
-    def checkout(self, chessMove : tuple, add_if_not_exists : bool = False):
+    def checkout(self, chessMove : tuple, add_if_not_exists : bool = False, use_transpositions : bool = True):
 
         child = self.current.get_child(chessMove)
+        use_transpositions = use_transpositions and self.transpositions is not None
 
         if child is None:
             if add_if_not_exists:
-                self.current.create_child(chessMove)
-                child = self.current.get_child(chessMove)
+                if use_transpositions:
+                    child = self.link_transposition(chessMove)
+                    if child is not None and self.max_nodes is not None:
+                        self.links[id(child)] = self.links.get(id(child), 1) + 1
+
+                if child is None:
+                    self.current.create_child(chessMove)
+                    child = self.current.get_child(chessMove)
+                    self.nodes_created += 1
+                    if self.max_nodes is not None:
+                        self.node_count += 1
+                        self.links[id(child)] = 1
+
+                    if use_transpositions:
+                        self.transpositions[(child.zobrist_hash, len(self.game_path) + 1)] = child
             else:
                 raise Exception("Child from move {} is not defined.".format(chessMove))
         
+        if use_transpositions:
+            # a shared node reports results back along whichever path reached it last
+            child.parent = self.current
+
         self.game_path.append(chessMove)
-        self.current = child
-    
+        previous, self.current = self.current, child
+
+        if self.lazy_tree is not None:
+            self.lazy_tree.touch(child)
+
+        if self.snapshot_interval is not None:
+            # rebuild the child from the parent's board before the parent lets go of it
+            if child.board is None:
+                child.restore_position()
+            self.release_position_behind(previous, len(self.game_path) - 1)
+
+    def commit_move(self, chessMove : tuple):
+        """ Plays a move in a game: the root's child for chessMove becomes the new root, keeping the search below it
+
+        The rest of the tree is let go (children a lazily loaded tree has not read in yet stay on disk). Further iterations
+        search from the new root, and with autosave it is saved in full, so a game should use its own save_dir.
+        """
+        self.reset_current()
+        if type(chessMove[0]) is not int:
+            chessMove = (self.root.square_to_board_index(chessMove[0]), self.root.square_to_board_index(chessMove[1]))
+        self.checkout(chessMove, add_if_not_exists=True)
+
+        new_root = self.current
+        if new_root.board is None:
+            new_root.restore_position()
+        new_root.parent = None
+
+        self.root = new_root
+        self.current = new_root
+        self.game_path = []
+        self.played_moves += (chessMove,)
+
+        # plies are counted from the root, so the transposition table and node budget are rebuilt for the new one
+        if self.transpositions is not None:
+            self.transpositions = {}
+            for node, ply in tree_stats.walk(new_root, loaded_only=True):
+                self.transpositions[(node.zobrist_hash, ply)] = node
+            if self.lazy_tree is not None:
+                self.lazy_tree.transpositions = self.transpositions
+        if self.max_nodes is not None:
+            self.set_node_budget(self.max_nodes, evict_batch=self.evict_batch)
+
+        # the saved tree and its journal still start from the old root
+        if self.autosave:
+            self.save_tree(tree_name=default_tree_name)
+
+    def set_root(self, position : ChessNode):
+        """ Starts the tree over from a copy of position, everything searched so far is let go
+        """
+        new_root = position.copy()
+        if self.root.bitboard is not None and new_root.bitboard is None:
+            from bitboard import BitBoard
+            new_root.bitboard = BitBoard(new_root.board)
+
+        self.root = new_root
+        self.current = new_root
+        self.game_path = []
+        self.played_moves = ()
+
+        # nothing under the new root is on disk
+        self.lazy_tree = None
+        if self.transpositions is not None:
+            self.transpositions = {(new_root.zobrist_hash, 0): new_root}
+        if self.max_nodes is not None:
+            self.set_node_budget(self.max_nodes, evict_batch=self.evict_batch)
+
+        # the saved tree and its journal still start from the old root
+        self.journal_records = 0
+        if self.autosave:
+            self.save_tree(tree_name=default_tree_name)
+
+    def move_to_position(self, position : ChessNode):
+        """ Makes position the root, reusing the subtree of a root child or grandchild holding it (the move played and
+        the reply to it), otherwise starting over
+        """
+        if position.zobrist_hash == self.root.zobrist_hash:
+            return
+
+        children = self.root._children or {}
+        for chessMove, child in children.items():
+            if child.zobrist_hash == position.zobrist_hash:
+                self.commit_move(chessMove)
+                return
+
+        for chessMove, child in children.items():
+            for reply, grandchild in (child._children or {}).items():
+                if grandchild.zobrist_hash == position.zobrist_hash:
+                    self.commit_move(chessMove)
+                    self.commit_move(reply)
+                    return
+
+        self.set_root(position)
+
+    def search(self, position : ChessNode = None, milliseconds : float = None, iterations : int = None, nodes : int = None):
+        """ Searches position (default the root) until a budget runs out or stop_search is called, returns the best move
+
+        The budgets are wall-clock milliseconds, search iterations and nodes added to the tree, whichever runs out
+        first. Iterations are not interrupted, so the time budget stops before an iteration that would likely overrun it
+        (by the average so far). At least one iteration runs. The best move is the root child with the most visits.
+        """
+        if milliseconds is None and iterations is None and nodes is None:
+            raise Exception("Set a time, iteration or node budget.")
+
+        if position is not None:
+            self.move_to_position(position)
+
+        self.stop_requested = False
+        nodes_before = self.nodes_created
+        completed = 0
+        start = time.perf_counter()
+        deadline = start + milliseconds / 1000 if milliseconds is not None else None
+
+        while True:
+            self.monte_carlo_tree_search(new_game=True)
+            completed += 1
+
+            if self.stop_requested:
+                break
+            if iterations is not None and completed >= iterations:
+                break
+            if nodes is not None and self.nodes_created - nodes_before >= nodes:
+                break
+            if deadline is not None:
+                now = time.perf_counter()
+                if now + (now - start) / completed > deadline:
+                    break
+
+        self.reset_current()
+        result = {
+            'move': None,
+            'visits': 0,
+            'stats': None,
+            'iterations': completed,
+            'nodes': self.nodes_created - nodes_before,
+            'seconds': time.perf_counter() - start,
+            'stopped': self.stop_requested,
+            'root_stats': self.root.stats,
+        }
+
+        children = self.root._children or {}
+        if len(children) > 0:
+            # most visits, ties go to the better score for the side to move
+            side = 1 if self.root.move == Turn.Black.value else 0
+            chessMove, child = max(children.items(), key=lambda item: (sum(item[1].stats), item[1].stats[side] + item[1].draws / 2))
+            result['move'], result['visits'], result['stats'] = chessMove, sum(child.stats), child.stats
+        return result
+
+    def stop_search(self):
+        """ Ends a running search() after the iteration in progress (safe to call from another thread)
+        """
+        self.stop_requested = True
+
+    def release_position_behind(self, node : ChessNode, ply : int):
+        """ Drops the board of a node the search has moved off, unless it is the root or a snapshot ply
+        """
+        # walking back down rebuilds each child from its parent in one move, so leaves can let go too
+        if node is self.root or ply % self.snapshot_interval == 0 or node.board is None:
+            return
+        node.release_position()
+
+    def link_transposition(self, chessMove : tuple):
+        """ Adds an already searched node for the position after chessMove as a child of the current node
+        """
+        key = (self.current.get_child_hash(chessMove), len(self.game_path) + 1)
+        node = self.transpositions.get(key)
+
+        if node is not None:
+            if type(chessMove[0]) is not int:
+                chessMove = (self.current.square_to_board_index(chessMove[0]), self.current.square_to_board_index(chessMove[1]))
+            self.current.add_child(chessMove, node)
+
+        return node
+
+    def merge_statistics(self, records : List[tuple]):
+        """ Adds results counted by another tree searched from the same root, given as (move path, (white wins, black wins, draws), state)
+
+        Each record only adds to the node at the end of its path (the nodes above it have records of their own). Missing
+        nodes are created, or with a transposition table found by position hash. With a node budget the nodes that got
+        children count as just visited, and the tree is brought back within budget afterwards.
+        """
+        released = []
+        grown = [] # (node, ply) of the nodes that got a child
+
+        for path, (white_wins, black_wins, draws), state in records:
+            node = self.root
+            for ply, chessMove in enumerate(path, start=1):
+                child = node.get_child(chessMove)
+
+                if child is None:
+                    # a board-less parent gets its board back to make the child, and lets go of it again afterwards
+                    if node.board is None:
+                        released.append(node)
+
+                    key = (node.get_child_hash(chessMove), ply)
+                    if self.transpositions is not None and key in self.transpositions:
+                        child = self.transpositions[key]
+                        if self.max_nodes is not None:
+                            self.links[id(child)] = self.links.get(id(child), 1) + 1
+                    else:
+                        # an orphan, the draw a new child would count is already in the results
+                        child = node.create_child(chessMove, make_orphan=True)
+                        child.parent = node
+                        if self.max_nodes is not None:
+                            self.node_count += 1
+                            self.links[id(child)] = 1
+                        if self.transpositions is not None:
+                            self.transpositions[key] = child
+                        if self.snapshot_interval is not None and ply % self.snapshot_interval != 0:
+                            released.append(child)
+                    node.add_child(chessMove, child)
+                    if self.max_nodes is not None:
+                        grown.append((node, ply - 1))
+                node = child
+
+            node.white_wins += white_wins
+            node.black_wins += black_wins
+            node.draws += draws
+            if state != StateEvaluation.PLAY.value:
+                node.state_evaluation = state
+
+        # children were made from their parent's board, let go of the ones a board-less tree would not keep
+        for node in released:
+            node.release_position()
+
+        if self.max_nodes is not None:
+            # records come shortest path first, so going backwards marks the deepest first (see enforce_node_budget)
+            for node, ply in reversed(grown):
+                self.expanded[id(node)] = (node, ply)
+                self.expanded.move_to_end(id(node))
+
+            # a merge adds many nodes at once, evict in as many batches as it takes
+            while self.node_count > self.max_nodes:
+                node_count = self.node_count
+                self.enforce_node_budget()
+                if self.node_count == node_count:
+                    break
+
+    def set_node_budget(self, max_nodes : int, evict_batch : int = 256):
+        """ Keeps the tree at about max_nodes nodes (in memory) by collapsing least recently visited subtrees
+
+        A collapsed node keeps its own stats, which already count everything below it, and is expanded again if the search
+        comes back to it. Each iteration removes at most evict_batch nodes, so a tree over budget shrinks over a few
+        iterations instead of in one pause. For a memory budget divide it by bytes_per_node from report().
+        """
+        self.max_nodes = max_nodes
+        self.evict_batch = evict_batch
+
+        # (node, ply) of every node with children, least recently visited first. Nodes already in the tree start out
+        # ordered by visits, so the least searched go first.
+        # links counts the parents of each node, a transposition is only dropped with the last of them
+        expanded = []
+        self.links = {}
+        self.node_count = 0
+        for node, ply in tree_stats.walk(self.root, loaded_only=True):
+            self.node_count += 1
+            if node._children is not None and len(node._children) > 0:
+                expanded.append((node, ply))
+                for child in node._children.values():
+                    self.links[id(child)] = self.links.get(id(child), 0) + 1
+        expanded.sort(key=lambda entry: sum(entry[0].stats))
+        self.expanded = OrderedDict((id(node), (node, ply)) for node, ply in expanded)
+
+    def enforce_node_budget(self, in_flight : List[List[ChessNode]] = ()):
+        """ Marks the current game path as just visited, then collapses subtrees while the tree is over budget
+
+        in_flight holds the node paths (from the root) of iterations still being simulated, they are kept as well.
+        """
+        path = [self.root]
+        for chessMove in self.game_path:
+            path.append(path[-1].get_child(chessMove))
+
+        pinned = set()
+        for visited in list(in_flight) + [path]:
+            # deepest first, so a node is always more recent than the nodes below it and subtrees go from the bottom up
+            for ply in range(len(visited) - 1, -1, -1):
+                node = visited[ply]
+                pinned.add(id(node))
+                if node._children is not None and len(node._children) > 0:
+                    self.expanded[id(node)] = (node, ply)
+                    self.expanded.move_to_end(id(node))
+
+        if self.node_count <= self.max_nodes:
+            return
+
+        # collapse takes each node out of expanded (with the expanded nodes below it), so the front is always the next one
+        removed = 0
+        while self.node_count > self.max_nodes and removed < self.evict_batch and len(self.expanded) > 0:
+            key, (node, ply) = next(iter(self.expanded.items()))
+            if key in pinned:
+                break # everything after this was visited by the current iteration
+            removed += self.collapse(node, ply)
+
+    def collapse(self, node : ChessNode, ply : int):
+        """ Drops the nodes below node that no other parent still reaches (transpositions stay), returns how many went
+        """
+        removed = 0
+        stack = [(child, ply + 1) for child in node._children.values()]
+
+        self.expanded.pop(id(node), None)
+        node._children = None
+        node.tree_source = None
+
+        while len(stack) > 0:
+            descendant, descendant_ply = stack.pop()
+            links = self.links.get(id(descendant), 1) - 1
+            if links > 0:
+                self.links[id(descendant)] = links
+                continue # still a child of a node outside the collapsed subtree
+
+            self.links.pop(id(descendant), None)
+            self.expanded.pop(id(descendant), None)
+            removed += 1
+            if self.transpositions is not None:
+                key = (descendant.zobrist_hash, descendant_ply)
+                if self.transpositions.get(key) is descendant:
+                    del self.transpositions[key]
+            if descendant._children is not None:
+                stack.extend((child, descendant_ply + 1) for child in descendant._children.values())
+
+        self.node_count -= removed
+        return removed
+
+    def report(self, loaded_only : bool = False):
+        """ Node, depth, branching, visit, terminal state and memory statistics of the whole tree, see tree_stats.tree_report
+        """
+        return tree_stats.tree_report(self.root, loaded_only=loaded_only, shared_nodes=self.transpositions is not None)
+
     def show_game_state(self):
         moves = self.current.get_legal_moves(chess_syntax=True)
 
@@ -109,106 +557,124 @@ class mcts():
                 break
 
             if ret_input == '1':
-                self.save_tree(tree_name='mcts_tree.obj')
+                self.save_tree(tree_name=default_tree_name)
             
             self.checkout(move, add_if_not_exists=False)
         self.show_game_state()
 
     def monte_carlo_tree_search(self, new_game=True):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter('selection')
+
+        new_leaf_node = self.select_leaf(new_game=new_game)
+
+        #* Step 3. Simulation
+        if new_leaf_node is not None:
+            if profiler is not None:
+                profiler.enter('simulation')
+
+            # simulate to terminal state using policy, on a scratch board outside the tree
+            rollout = Rollout(new_leaf_node, random_move_odds=4)
+            try:
+                result = rollout.play()
+            except Exception:
+                self.save_tree(tree_name=default_tree_name)
+                print("Failure to simulate with Naive Bot")
+                traceback.print_exc()
+                quit()
+
+            print("Termination state reached:", rollout.position.get_state_evaluation())
+            print("Number of Moves:", len(self.game_path) + rollout.plies)
+            
+            #* Step 4. Backpropagation
+            if profiler is not None:
+                profiler.record_rollout(rollout.plies)
+                profiler.enter('backpropagation')
+            new_leaf_node.backpropogate_results(result)
+            print("Root states:", self.root.stats)
+        
+        self.finish_iteration()
+
+    def finish_iteration(self, in_flight : List[List[ChessNode]] = ()):
+        """ Steps after an iteration's backpropagation: journals the current game path and keeps the tree within its
+        node budget (sparing the node paths in in_flight, see enforce_node_budget)
+        """
+        profiler = self.profiler
+
+        # save updated mcts model
+        if profiler is not None:
+            profiler.enter('save')
+        self.save_iteration(tree_name=default_tree_name)
+
+        if self.max_nodes is not None:
+            if profiler is not None:
+                profiler.enter('eviction')
+            self.enforce_node_budget(in_flight)
+
+        if profiler is not None:
+            profiler.end_iteration()
+
+    def select_leaf(self, new_game=True):
+        """ Selection and expansion steps of a search iteration, returns the new leaf to simulate from
+
+        Returns None when the iteration reached the end of a game inside the tree, that result is already counted.
+        """
         if new_game:
             self.reset_current()
         
         policy = NaiveBot.suggest_move_from_options
+        iteration_visits = sum(self.root.stats)
         
         # * Step 1. Selection
-        # traverse down using UCT (and policy for tie-breakers) until leaf node found
-        while len(self.current.children.keys()) > 0:
+        # traverse down using UCT (and policy to pick among unexplored moves) until leaf node found
+        while len(self.current.children) > 0:
             moves, state = self.define_state()
+            children = self.current.children
+
+            # moves that have not been checked have infinite potential, let the policy choose among them
+            unexplored_moves = [move for move in moves if move not in children]
+
+            if len(unexplored_moves) == 0:
+                # (white wins, black wins, draws) of every child, in move order
+                stats = np.array([children[move].stats for move in moves], dtype=np.float64)
+                visits = stats.sum(axis=1)
+
+                # children added outside of a search may not have been simulated yet
+                unexplored_moves = [moves[index] for index in np.flatnonzero(visits == 0)]
+
+            if len(unexplored_moves) > 1:
+                suggested_move = policy(self.current, unexplored_moves)
+            elif len(unexplored_moves) == 1:
+                suggested_move = unexplored_moves[0]
+            else:
+                # the win rate of the child state for whoever turn it is
+                wins = stats[:, 0] if self.current.move == Turn.Black.value else stats[:, 1]
+                suggested_move = moves[uct_select(wins, stats[:, 2], visits, sum(self.current.stats))]
 
-            potential_moves = []
-            max_move_score = 0
-            
-            # check all current node's possible next states
-            for move in moves:
-                child = self.current.children.get(move)
-                if child is None:
-                    # there are move(s) that have not been checked (infinite potential)    
-                    if max_move_score < float('inf'):
-                        max_move_score = float('inf')
-                        potential_moves = []
-                    potential_moves.append(move)
-                else:
-                    
-                    # stands for the number of simulations for the node considered after the i-th move
-                    n_i = sum(child.stats)
-                    
-                    # the win rate of the child state for whoever turn it is
-                    win_rate = child.stats[0] if child.move == Turn.White.value else child.stats[1]
-                    win_rate += child.stats[2] / 2 # add half points for draws
-                    win_rate /= n_i
-                    
-                    # stands for the total number of simulations after the i-th move run by the parent node of the one considered
-                    N_i = sum(self.current.stats)
-                    
-                    # Upper Confidence Bound 1 equation
-                    move_score = win_rate + (math.sqrt(2) * math.sqrt(math.log(N_i) / n_i))
-                    
-                    if move_score > max_move_score:
-                        max_move_score = move_score
-                        potential_moves = [move]
-                    elif move_score == max_move_score:
-                        potential_moves.append(move)
-                
-                if len(potential_moves) > 1:
-                    suggested_move = policy(self.current, potential_moves)
-                else:
-                    suggested_move = potential_moves[0]
-                
             self.checkout(suggested_move, add_if_not_exists=True)
             
         #* Step 2. Expansion
+        if self.profiler is not None:
+            self.profiler.enter('expansion')
         moves, state = self.define_state()
 
+        if state != StateEvaluation.PLAY.value:
+            # selection ended on a game that is already over, count its result again
+            if sum(self.root.stats) == iteration_visits:
+                self.current.backpropogate_results(self.current.get_result_index())
+            return None
+
         # use policy to expand
         suggested_move = policy(self.current, moves)
 
         self.checkout(suggested_move, add_if_not_exists=True)
-        new_leaf_node = self.current
-
-        #* Step 3. Simulation
-
-        # simulate to terminal state using policy
-        while True:
-            moves, state = self.define_state()
-
-            if state != StateEvaluation.PLAY.value:
-                break
-
-            try:
-                suggested_move = NaiveBot.suggest_move_from_options(self.current, moves, random_move_odds=4)
-            except Exception:
-                self.save_tree(tree_name='mcts_tree.obj')
-                print("Failure to suggest with Naive Bot")
-                traceback.print_exc()
-                quit()
-            
-            try:
-                self.checkout(suggested_move, add_if_not_exists=True)
-            except Exception:
-                self.save_tree(tree_name='mcts_tree.obj')
-                print("Failure to Create Child")
-                traceback.print_exc()
-                quit()
-        
-        #* Step 4. Backpropagation
-        # win-loss-tie stats are updated automatically when a termination state is detected
-        # cut off random simulation from tree
-        new_leaf_node.children = {}
-        
-        # save updated mcts model
-        self.save_tree(tree_name='mcts_tree.obj')
 
+        moves, state = self.define_state() # a leaf that ends the game is scored here
+        if state != StateEvaluation.PLAY.value:
+            return None
 
+        return self.current
 
     def naive_bot_game(self, new_game=True):
         if new_game:
@@ -224,7 +690,7 @@ class mcts():
             try:
                 suggested_move = NaiveBot.suggest_move_from_options(self.current, moves, random_move_odds=4)
             except Exception:
-                self.save_tree(tree_name='mcts_tree.obj')
+                self.save_tree(tree_name=default_tree_name)
                 print("Failure to suggest with Naive Bot")
                 traceback.print_exc()
                 quit()
@@ -232,7 +698,7 @@ class mcts():
             try:
                 self.checkout(suggested_move, add_if_not_exists=True)
             except Exception:
-                self.save_tree(tree_name='mcts_tree.obj')
+                self.save_tree(tree_name=default_tree_name)
                 print("Failure to Create Child")
                 traceback.print_exc()
                 quit()
@@ -252,7 +718,7 @@ class mcts():
             clear()
 
             if ret_input == '1':
-                self.save_tree(tree_name='mcts_tree.obj')
+                self.save_tree(tree_name=default_tree_name)
 
             if ret_input == '0':
                 break
@@ -262,19 +728,109 @@ class mcts():
 
             self.checkout(moves[chosen_move], add_if_not_exists=True)
 
+    def clear_move_caches(self):
+        """ Drops every cached legal move list in the tree (they are regenerated on demand)
+        """
+        # only nodes in memory have caches, and each shared node is cleared once
+        for node, _ in tree_stats.walk(self.root, loaded_only=True):
+            node.clear_legal_moves_cache()
+
     def save_tree(self, tree_name : str = str(datetime.datetime.now()).replace(':', '.') + ".obj"):
 
         tree_name = str(self.save_dir.joinpath(tree_name))
-        with open(tree_name, 'wb+') as ofile:
-            pickle.dump(self, ofile)
+        self.journal_records = 0
+
+        # write to the side and swap in, so a crash mid-save leaves the previous snapshot intact
+        if tree_name.endswith('.obj'):
+            if self.lazy_tree is not None:
+                # a pickle holds the whole tree, and the loaded file may be the one being replaced
+                self.lazy_tree.close(self.root)
+                self.lazy_tree = None
+
+            with open(tree_name + '.tmp', 'wb+') as ofile:
+                pickle.dump(self, ofile)
+                ofile.flush()
+                os.fsync(ofile.fileno())
+            os.replace(tree_name + '.tmp', tree_name)
+        else:
+            # subtrees a lazily loaded tree has not read in are copied over from its file, then read from the new one
+            order = tree_file.write_tree(tree_name + '.tmp', self.root, snapshot_interval=self.snapshot_interval, compact_every=self.compact_every,
+                                         use_transpositions=self.transpositions is not None, include_boards=self.save_boards, lazy_tree=self.lazy_tree)
+            if self.lazy_tree is not None:
+                self.lazy_tree.saved_tree = None # unmapped, the loaded file may be the one being replaced
+            os.replace(tree_name + '.tmp', tree_name)
+
+            if self.lazy_tree is not None:
+                self.lazy_tree = self.lazy_tree.reopen(tree_name, order)
+
+        # the snapshot now holds everything the journal did
+        if os.path.exists(journal_file(tree_name)):
+            os.remove(journal_file(tree_name))
+
+    def save_iteration(self, tree_name : str = default_tree_name):
+        """ Appends the nodes along the current game path to the tree's journal, compacting it into a full save when due
+        """
+        if not self.autosave:
+            return
+
+        if self.journal_records + 1 >= self.compact_every or not self.save_dir.joinpath(tree_name).exists():
+            self.save_tree(tree_name=tree_name)
+            return
+
+        # an iteration only creates and updates nodes on the path it walked, so store the path and where those nodes ended up
+        nodes = [self.root]
+        for chessMove in self.game_path:
+            nodes.append(nodes[-1].get_child(chessMove))
+
+        record = {
+            'path': self.game_path,
+            'stats': [node.stats for node in nodes],
+            'states': [node.state_evaluation for node in nodes],
+        }
+
+        with open(journal_file(self.save_dir.joinpath(tree_name)), 'a') as ofile:
+            ofile.write(json.dumps(record) + '\n')
+        self.journal_records += 1
+
+    def replay_journal(self, journal_name : str):
+        """ Re-applies the journaled iterations on top of a loaded snapshot
+        """
+        if not os.path.exists(journal_name):
+            return
+
+        with open(journal_name, 'rb+') as ifile:
+            for line in iter(ifile.readline, b''):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+
+                if record is None or not line.endswith(b'\n'):
+                    # a record cut short by a crash, drop it so the next one starts on a fresh line
+                    ifile.seek(ifile.tell() - len(line))
+                    ifile.truncate()
+                    break
+
+                self.reset_current()
+                nodes = [self.root]
+                for chessMove in record['path']:
+                    self.checkout(tuple(chessMove), add_if_not_exists=True)
+                    nodes.append(self.current)
+
+                # stats are stored as totals, so replaying a record twice changes nothing
+                for node, stats, state in zip(nodes, record['stats'], record['states']):
+                    node.white_wins, node.black_wins, node.draws = stats
+                    node.state_evaluation = state
+                self.journal_records += 1
+
+        self.reset_current()
 
-    
     def define_state(self, save_on_termination_state=False):
         
         try:
             moves = self.current.get_legal_moves() # gets moves and updates state evaluation
         except Exception:
-                self.save_tree(tree_name='mcts_tree.obj')
+                self.save_tree(tree_name=default_tree_name)
                 print("Failure to get move list")
                 traceback.print_exc()
                 quit()
@@ -287,7 +843,7 @@ class mcts():
             print("Root states:", self.root.stats)
 
             if save_on_termination_state:
-                self.save_tree(tree_name='mcts_tree.obj')
+                self.save_tree(tree_name=default_tree_name)
         
         return moves, node_evaluation
 
@@ -297,13 +853,17 @@ if __name__ == '__main__':
     replay = False
     load = True
 
+    # trees pickled before the binary tree format are converted once
+    if not default_save_dir.joinpath(default_tree_name).exists() and default_save_dir.joinpath('mcts_tree.obj').exists():
+        tree_file.convert_pickle(default_save_dir.joinpath('mcts_tree.obj'), default_save_dir.joinpath(default_tree_name))
+
     if replay:
-        tree = mcts(import_tree_file='model/mcts_tree.obj')
+        tree = mcts(import_tree_file=default_save_dir.joinpath(default_tree_name), lazy_load=True)
         tree.replay_game()
 
     elif load:
 
-        tree = mcts(import_tree_file='model/mcts_tree.obj')
+        tree = mcts(import_tree_file=default_save_dir.joinpath(default_tree_name), lazy_load=True)
 
         print(len(tree.root.children.keys()))
         for key, value in tree.root.children.items():
@@ -27,15 +27,54 @@ class NaiveBot:
             
             piece_value_states.append(new_state.board_piece_value(new_state.move)) # add the total value of pieces for the opponent to a list of value states
             
-            new_state.move = Turn.Black.value if new_state.move == Turn.White.value else Turn.White.value
-            
             try:
-                move_potential = len(new_state.get_legal_moves())
+                move_potential = new_state.get_mobility(state.move) # moves we would have if it were our turn again
             except:
                 return move # puts king in check, just do it.
             
             move_value_states.append(move_potential)
         
+        return NaiveBot.choose_from_value_states(moves, piece_value_states, move_value_states)
+
+    def suggest_move_in_place(state : ChessNode, moves : List[tuple], random_move_odds : int = 1):
+        """ Same policy as suggest_move_from_options, trying each move with make/unmake on state instead of creating children
+        """
+
+        chosen_random = random.randint(0, random_move_odds) != 0
+        
+        if chosen_random:
+            chosen_move = random.randint(0, len(moves) - 1)
+            return moves[chosen_move]
+
+        piece_value_states = [] # the value state based the opponents un-captured pieces
+        move_value_states = []  # the value state based on potential new moves 
+        our_move = state.move
+
+        for move in moves:
+            undo = state.make_move(move)
+            try:
+                if state.get_state_evaluation() != StateEvaluation.PLAY.value:
+                    return move # draw
+
+                new_state_moves, _ = state.generate_legal_moves(state.move)
+                
+                if len(new_state_moves) == 0:
+                    return move # checkmate or stalemate
+                
+                piece_value_states.append(state.board_piece_value(state.move)) # add the total value of pieces for the opponent to a list of value states
+                
+                try:
+                    move_potential = state.get_mobility(our_move) # moves we would have if it were our turn again
+                except:
+                    return move # puts king in check, just do it.
+                
+                move_value_states.append(move_potential)
+            finally:
+                state.unmake_move(undo)
+
+        return NaiveBot.choose_from_value_states(moves, piece_value_states, move_value_states)
+
+    def choose_from_value_states(moves : List[tuple], piece_value_states : List[int], move_value_states : List[int]):
         # make move that takes best piece
         min_state = min(piece_value_states)
         state_count = 0
@@ -0,0 +1,145 @@
+from chess_node import *
+
+import sys
+import json
+import time
+import argparse
+
+
+# piece letters of a FEN board, white upper case
+FEN_PIECES = {
+    'K': PieceType.WK.value, 'Q': PieceType.WQ.value, 'B': PieceType.WB.value, 'N': PieceType.WN.value, 'R': PieceType.WR.value, 'P': PieceType.WP.value,
+    'k': PieceType.BK.value, 'q': PieceType.BQ.value, 'b': PieceType.BB.value, 'n': PieceType.BN.value, 'r': PieceType.BR.value, 'p': PieceType.BP.value,
+}
+PROMOTION_LETTERS = {piece: letter.lower() for letter, piece in FEN_PIECES.items()}
+
+# (FEN board and side to move, leaf counts by depth). The counts are for this move generator: no castling, no en
+# passant and pinned pieces that do not move, so they only match published perft numbers where none of those come up.
+POSITIONS = {
+    'start': ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w', {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    'middlegame': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w', {1: 46, 2: 1865, 3: 86447, 4: 3493553}),
+    'rook endgame': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w', {1: 14, 2: 191, 3: 2810, 4: 43087}),
+    'promotions': ('n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b', {1: 24, 2: 496, 3: 9483, 4: 182838}),
+}
+
+
+def position_from_fen(fen : str, use_bitboard : bool = False):
+    """ ChessNode for a FEN board and side to move (castling and en passant fields, if given, are ignored)
+    """
+    fields = fen.split()
+    board = []
+    for row in fields[0].split('/'):
+        for letter in row:
+            if letter.isdigit():
+                board.extend([PieceType.E.value] * int(letter))
+            else:
+                board.append(FEN_PIECES[letter])
+
+    if len(board) != 64:
+        raise Exception("{} does not describe 64 squares.".format(fields[0]))
+
+    side_to_move = Turn.Black.value if len(fields) > 1 and fields[1] == 'b' else Turn.White.value
+    return ChessNode(import_board=board, use_bitboard=use_bitboard, side_to_move=side_to_move)
+
+def move_name(position : ChessNode, chessMove : tuple):
+    """ Long algebraic name of a move, e.g. e2e4 or a7a8q
+    """
+    name = position.board_index_to_square(chessMove[0]) + position.board_index_to_square(chessMove[1])
+    if len(chessMove) == 3:
+        name += PROMOTION_LETTERS[chessMove[2]]
+    return name
+
+def perft(position : ChessNode, depth : int):
+    """ Number of move sequences of the given length from the position, played in place on a scratch copy
+    """
+    if depth == 0:
+        return 1
+
+    moves, _ = position.generate_legal_moves(position.move)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        undo = position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(undo)
+    return nodes
+
+def divide(position : ChessNode, depth : int):
+    """ perft of every root move, as (move, leaf count) pairs in generation order
+    """
+    position = position.copy()
+    moves, _ = position.generate_legal_moves(position.move)
+
+    counts = []
+    for move in moves:
+        undo = position.make_move(move)
+        counts.append((move, perft(position, depth - 1)))
+        position.unmake_move(undo)
+    return counts
+
+def run_perft(name : str, fen : str, depth : int, use_bitboard : bool = False, expected : dict = None, show_divide : bool = False):
+    """ Times perft of one position to each depth up to depth, returns one result dict per depth
+    """
+    position = position_from_fen(fen, use_bitboard=use_bitboard)
+    results = []
+
+    for current_depth in range(1, depth + 1):
+        start = time.perf_counter()
+        if show_divide and current_depth == depth:
+            counts = divide(position, current_depth)
+            nodes = sum(count for _, count in counts)
+        else:
+            counts = None
+            nodes = perft(position.copy(), current_depth)
+        seconds = time.perf_counter() - start
+
+        result = {
+            'position': name,
+            'fen': fen,
+            'generator': 'bitboard' if use_bitboard else 'board',
+            'depth': current_depth,
+            'nodes': nodes,
+            'seconds': seconds,
+            'nodes_per_second': nodes / seconds if seconds > 0 else None,
+            'expected': expected.get(current_depth) if expected is not None else None,
+        }
+        result['ok'] = result['expected'] is None or result['expected'] == nodes
+        if counts is not None:
+            result['divide'] = {move_name(position, move): count for move, count in counts}
+        results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Counts leaf nodes of the move generator to a fixed depth and times it")
+    parser.add_argument('--depth', type=int, default=3, help="deepest depth to count (default 3)")
+    parser.add_argument('--position', action='append', help="name of a stored position to run (default all)")
+    parser.add_argument('--fen', help="run this FEN board and side to move instead of the stored positions")
+    parser.add_argument('--bitboard', action='store_true', help="use the bitboard move generator")
+    parser.add_argument('--divide', action='store_true', help="break the deepest count down by root move")
+    parser.add_argument('--output', help="write the results to this file as JSON")
+    args = parser.parse_args()
+
+    if args.fen is not None:
+        runs = [('fen', args.fen, None)]
+    else:
+        runs = [(name, fen, expected) for name, (fen, expected) in POSITIONS.items() if args.position is None or name in args.position]
+
+    all_results = []
+    for name, fen, expected in runs:
+        for result in run_perft(name, fen, args.depth, use_bitboard=args.bitboard, expected=expected, show_divide=args.divide):
+            all_results.append(result)
+            status = '' if result['expected'] is None else ('ok' if result['ok'] else 'MISMATCH (expected {})'.format(result['expected']))
+            print("{:<14} depth {}  {:>10} nodes  {:>8.3f} s  {:>9.0f} nodes/s  {}".format(name, result['depth'], result['nodes'], result['seconds'],
+                                                                                   result['nodes_per_second'] or 0, status))
+            for move, count in result.get('divide', {}).items():
+                print("    {:<8} {}".format(move, count))
+
+    if args.output is not None:
+        with open(args.output, 'w') as ofile:
+            json.dump(all_results, ofile, indent=2)
+
+    if not all(result['ok'] for result in all_results):
+        sys.exit(1)
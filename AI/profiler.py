@@ -0,0 +1,145 @@
+from chess_node import ChessNode
+
+import time
+import json
+
+
+# ChessNode methods counted while a profiler with count_calls is active
+COUNTED_METHODS = ('get_legal_moves', 'generate_legal_moves', 'get_checks_and_pins', 'create_child')
+
+
+class SearchProfiler():
+    """ Phase timers, ChessNode call counters and a rollout length histogram for mcts searches
+
+    Set it as tree.profiler to use it, searches only check for it once per phase, so a tree without one pays nothing.
+    Call counting swaps counting wrappers into ChessNode for as long as the profiler is open (one at a time).
+    Snapshots are written as JSON lines to snapshot_file every snapshot_every iterations and/or snapshot_seconds.
+    """
+
+    def __init__(self, snapshot_file : str = None, snapshot_every : int = None, snapshot_seconds : float = None, count_calls : bool = True, histogram_bin : int = 10):
+        self.snapshot_file = snapshot_file
+        self.snapshot_every = snapshot_every
+        self.snapshot_seconds = snapshot_seconds
+        self.histogram_bin = histogram_bin
+
+        self.started = time.time()
+        self.last_snapshot = time.perf_counter()
+        self.iterations = 0
+
+        self.phase = None
+        self.phase_started = None
+        self.phase_seconds = {}
+
+        self.calls = {}             # (phase, method name) -> call count
+        self.rollouts = 0
+        self.rollout_plies = 0
+        self.rollout_lengths = {}   # histogram bin start -> rollouts
+
+        self.originals = {}
+        if count_calls:
+            self.install()
+
+    def install(self):
+        """ Puts a counting wrapper around each of COUNTED_METHODS on ChessNode
+        """
+        for name in COUNTED_METHODS:
+            method = getattr(ChessNode, name)
+            self.originals[name] = method
+            setattr(ChessNode, name, self.counting(name, method))
+
+    def counting(self, name : str, method):
+        calls = self.calls
+        profiler = self
+
+        def counted(*args, **kwargs):
+            key = (profiler.phase, name)
+            calls[key] = calls.get(key, 0) + 1
+            return method(*args, **kwargs)
+        return counted
+
+    def close(self):
+        """ Puts the original ChessNode methods back and writes a last snapshot
+        """
+        for name, method in self.originals.items():
+            setattr(ChessNode, name, method)
+        self.originals = {}
+
+        self.enter(None)
+        if self.snapshot_file is not None:
+            self.write_snapshot()
+
+    def enter(self, phase : str):
+        """ Ends the running phase (adding its time) and starts the next one, None for no phase
+        """
+        now = time.perf_counter()
+        if self.phase is not None:
+            self.phase_seconds[self.phase] = self.phase_seconds.get(self.phase, 0.0) + now - self.phase_started
+        self.phase = phase
+        self.phase_started = now
+
+    def record_rollout(self, plies : int):
+        self.rollouts += 1
+        self.rollout_plies += plies
+        bin_start = plies - plies % self.histogram_bin
+        self.rollout_lengths[bin_start] = self.rollout_lengths.get(bin_start, 0) + 1
+
+    def end_iteration(self):
+        self.enter(None)
+        self.iterations += 1
+
+        if self.snapshot_file is None:
+            return
+        if (self.snapshot_every is not None and self.iterations % self.snapshot_every == 0) or \
+           (self.snapshot_seconds is not None and time.perf_counter() - self.last_snapshot >= self.snapshot_seconds):
+            self.write_snapshot()
+
+    def snapshot(self):
+        """ Totals so far as a JSON-ready dict
+        """
+        calls = {}
+        for (phase, name), count in self.calls.items():
+            calls.setdefault(phase or 'other', {})[name] = count
+
+        return {
+            'time': time.time(),
+            'elapsed': time.time() - self.started,
+            'iterations': self.iterations,
+            'phase_seconds': dict(self.phase_seconds),
+            'calls': calls,
+            'rollouts': self.rollouts,
+            'rollout_plies': self.rollout_plies,
+            'rollout_lengths': {str(bin_start): count for bin_start, count in sorted(self.rollout_lengths.items())},
+        }
+
+    def write_snapshot(self):
+        with open(self.snapshot_file, 'a') as ofile:
+            ofile.write(json.dumps(self.snapshot()) + '\n')
+        self.last_snapshot = time.perf_counter()
+
+
+if __name__ == '__main__':
+    import io
+    import sys
+    import random
+    import contextlib
+    from mcts import mcts
+
+    # python profiler.py [iterations] [snapshot file]
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    random.seed(0)
+    tree = mcts(autosave=False)
+    tree.profiler = SearchProfiler(snapshot_file=sys.argv[2] if len(sys.argv) > 2 else None, snapshot_every=10)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            tree.monte_carlo_tree_search(new_game=True)
+    tree.profiler.close()
+
+    snapshot = tree.profiler.snapshot()
+    total = sum(snapshot['phase_seconds'].values())
+    for phase, seconds in snapshot['phase_seconds'].items():
+        print("{:<16} {:>8.3f} s  {:>5.1f}%".format(phase, seconds, seconds / total * 100))
+    for phase, counts in snapshot['calls'].items():
+        print("{:<16} {}".format(phase, counts))
+    print("Rollout lengths:", snapshot['rollout_lengths'])
@@ -0,0 +1,38 @@
+from chess_node import *
+from naive_bot import NaiveBot
+from bitboard import BitBoard
+
+
+class Rollout():
+    """ Simulates a game to its end from a position, playing every move in place on one scratch copy of the board
+    """
+
+    def __init__(self, node : ChessNode, random_move_odds : int = 4):
+        self.position = node.copy()
+        self.random_move_odds = random_move_odds
+        self.plies = 0
+
+        # the bitboard generator lists the same moves in the same order, only faster
+        if self.position.bitboard is None:
+            self.position.bitboard = BitBoard(self.position.board)
+
+    def play(self):
+        """ Plays the NaiveBot policy until the game ends, returns the stats index of the result (0 white, 1 black, 2 draw)
+        """
+        position = self.position
+
+        while position.get_state_evaluation() == StateEvaluation.PLAY.value:
+            moves, in_check = position.generate_legal_moves(position.move)
+
+            if len(moves) == 0:
+                if in_check:
+                    position.state_evaluation = StateEvaluation.CHECKMATE.value
+                else:
+                    position.state_evaluation = StateEvaluation.STALEMATE.value
+                break
+
+            suggested_move = NaiveBot.suggest_move_in_place(position, moves, random_move_odds=self.random_move_odds)
+            position.make_move(suggested_move)
+            self.plies += 1
+
+        return position.get_result_index()
@@ -0,0 +1,120 @@
+from chess_node import *
+from mcts import mcts, default_tree_name
+
+import os
+import sys
+import random
+import multiprocessing
+
+
+def search_worker(connection, root_board : bytes, root_side : int, use_bitboard : bool, use_transpositions : bool, seed : int):
+    """ Grows an independent tree from the given root, sending back what changed every time it is asked for more iterations
+    """
+    random.seed(seed)
+    sys.stdout = open(os.devnull, 'w') # search iterations print their results
+
+    tree = mcts(use_bitboard=use_bitboard, autosave=False)
+    tree.root = ChessNode(import_board=root_board, use_bitboard=use_bitboard, side_to_move=root_side)
+    tree.current = tree.root
+    if use_transpositions:
+        tree.transpositions = {(tree.root.zobrist_hash, 0): tree.root}
+
+    # id of a node -> stats already sent for it. Keyed by node rather than by path, so a node that transpositions let
+    # several paths reach is only sent once (the worker's tree never lets go of nodes, so ids stay unique)
+    sent_stats = {}
+
+    while True:
+        iterations = connection.recv()
+        if iterations is None:
+            break
+
+        # an iteration only changes nodes on the path it walked, the path is only kept to find the node on the master
+        touched = {} # id of a node -> (a move path to it, node)
+        for _ in range(iterations):
+            tree.monte_carlo_tree_search(new_game=True)
+
+            node = tree.root
+            touched.setdefault(id(node), ((), node))
+            for ply in range(len(tree.game_path)):
+                node = node.get_child(tree.game_path[ply])
+                touched.setdefault(id(node), (tuple(tree.game_path[:ply + 1]), node))
+
+        records = []
+        for key, (path, node) in touched.items():
+            previous = sent_stats.get(key, (0, 0, 0))
+            stats = node.stats
+            sent_stats[key] = stats
+            records.append((path, (stats[0] - previous[0], stats[1] - previous[1], stats[2] - previous[2]), node.state_evaluation))
+
+        # shortest paths first, so the master creates parents before their children
+        records.sort(key=lambda record: len(record[0]))
+        connection.send(records)
+
+    connection.close()
+
+
+class RootParallelSearch():
+    """ Root parallelization: worker processes each grow their own tree from the tree's root, and every merge_interval
+    iterations (per worker) their results are added into the tree by move path
+    """
+
+    def __init__(self, tree : mcts, workers : int = None, merge_interval : int = 100, seed : int = None):
+        self.tree = tree
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.merge_interval = merge_interval
+
+        # worker i plays with seed + i, so a run can be repeated
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seeds = [seed + worker for worker in range(self.workers)]
+
+        root = tree.root
+        if root.board is None:
+            root.restore_position()
+
+        self.connections = []
+        self.processes = []
+        for worker_seed in self.seeds:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=search_worker, args=(worker_connection, bytes(root.board), root.move, root.bitboard is not None,
+                                                                          tree.transpositions is not None, worker_seed), daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def run(self, iterations : int):
+        """ Runs about iterations search iterations split over the workers, merging results as they come in
+        """
+        remaining = iterations
+        while remaining > 0:
+            # one merge interval per worker, the last round split evenly
+            batch = min(self.merge_interval, -(-remaining // self.workers))
+            counts = [min(batch, remaining - batch * worker) for worker in range(self.workers)]
+            counts = [count for count in counts if count > 0]
+
+            for connection, count in zip(self.connections, counts):
+                connection.send(count)
+            for connection, count in zip(self.connections, counts):
+                self.tree.merge_statistics(connection.recv())
+
+            remaining -= sum(counts)
+
+        if self.tree.autosave:
+            self.tree.save_tree(tree_name=default_tree_name)
+
+    def close(self):
+        for connection, process in zip(self.connections, self.processes):
+            connection.send(None)
+            process.join()
+            connection.close()
+
+        self.connections = []
+        self.processes = []
+
+
+if __name__ == '__main__':
+    from benchmark import worker_scaling
+
+    # python root_parallel.py [iterations]
+    worker_scaling(lambda tree, workers: RootParallelSearch(tree, workers=workers, merge_interval=50, seed=0), int(sys.argv[1]) if len(sys.argv) > 1 else 200)
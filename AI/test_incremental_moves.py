@@ -0,0 +1,59 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chess_node import *
+from mcts import mcts
+
+import io
+import random
+import contextlib
+
+import pytest
+
+
+@pytest.fixture
+def incremental(monkeypatch):
+    # every incremental list is checked against full generation, a mismatch raises
+    monkeypatch.setattr(ChessNode, 'incremental_moves', True)
+    monkeypatch.setattr(ChessNode, 'verify_incremental_moves', True)
+
+def plain_moves(node : ChessNode):
+    # a node without a parent has no grandparent moves to reuse
+    return ChessNode(import_board=bytes(node.board), side_to_move=node.move).get_legal_moves()
+
+def test_random_games_match_plain_generation(incremental):
+    rng = random.Random(7)
+    reused = 0
+
+    for _ in range(20):
+        node = ChessNode()
+        while node.state_evaluation == StateEvaluation.PLAY.value and node.last_progress < 150:
+            if node.get_base_moves(node.move) is not None:
+                reused += 1
+            legal_moves = node.get_legal_moves()
+            assert legal_moves == plain_moves(node)
+            if len(legal_moves) == 0:
+                break
+            node = node.create_child(legal_moves[rng.randrange(len(legal_moves))])
+
+    assert reused > 0
+
+def search(iterations : int):
+    random.seed(21)
+    tree = mcts(autosave=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            tree.monte_carlo_tree_search()
+    return [(chessMove, child.stats) for chessMove, child in tree.root.children.items()]
+
+def test_search_matches_plain_generation(monkeypatch):
+    plain = search(10)
+
+    monkeypatch.setattr(ChessNode, 'incremental_moves', True)
+    monkeypatch.setattr(ChessNode, 'verify_incremental_moves', True)
+    assert search(10) == plain
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-q'])
@@ -0,0 +1,91 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mcts import mcts
+from tree_stats import walk
+
+import io
+import random
+import contextlib
+
+
+# two move orders reaching the same position at ply 3 (knights g1-f3, g8-f6, b1-c3)
+FIRST_ORDER = [(62, 45), (6, 21), (57, 42)]
+SECOND_ORDER = [(57, 42), (6, 21), (62, 45)]
+
+
+def count_nodes(tree : mcts):
+    return sum(1 for _ in walk(tree.root, loaded_only=True))
+
+def play(tree : mcts, path : list, enforce : bool = False):
+    tree.reset_current()
+    for chessMove in path:
+        tree.checkout(chessMove, add_if_not_exists=True)
+    tree.current.backpropogate_results(0)
+    if enforce:
+        tree.enforce_node_budget()
+    tree.reset_current()
+
+def test_collapse_keeps_shared_nodes():
+    tree = mcts(autosave=False, use_transpositions=True, max_nodes=1000)
+    play(tree, FIRST_ORDER)
+    play(tree, SECOND_ORDER)
+
+    shared = tree.root
+    for chessMove in FIRST_ORDER:
+        shared = shared.get_child(chessMove)
+    assert shared is tree.root.get_child(SECOND_ORDER[0]).get_child(SECOND_ORDER[1]).get_child(SECOND_ORDER[2])
+    assert tree.node_count == count_nodes(tree) == 6
+
+    # the shared node is still reached through the second order
+    first = tree.root.get_child(FIRST_ORDER[0])
+    assert tree.collapse(first, 1) == 1
+    assert tree.node_count == count_nodes(tree) == 5
+    assert shared in tree.transpositions.values()
+
+    # with its last parent gone it goes too
+    second = tree.root.get_child(SECOND_ORDER[0])
+    assert tree.collapse(second, 1) == 2
+    assert tree.node_count == count_nodes(tree) == 3
+    assert shared not in tree.transpositions.values()
+
+def test_node_count_matches_tree_with_transpositions():
+    random.seed(5)
+    tree = mcts(autosave=False, use_transpositions=True, max_nodes=12, evict_batch=4)
+    white, black = [(62, 45), (57, 42)], [(6, 21), (1, 18)]
+
+    # knight moves in random orders keep reaching the same positions through different paths
+    for _ in range(200):
+        random.shuffle(white)
+        random.shuffle(black)
+        path = [white[0], black[0], white[1], black[1]][:random.randint(1, 4)]
+        play(tree, path, enforce=True)
+        assert tree.node_count == count_nodes(tree)
+    assert any(links > 1 for links in tree.links.values())
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(40):
+            tree.monte_carlo_tree_search()
+            tree.reset_current()
+            assert tree.node_count == count_nodes(tree)
+
+def test_merge_keeps_node_budget():
+    tree = mcts(autosave=False, use_transpositions=True, snapshot_interval=2, max_nodes=6, evict_batch=2)
+    white, black = [(62, 45), (57, 42), (48, 40)], [(6, 21), (1, 18), (8, 16)]
+
+    # every knight and pawn opening pair, shortest paths first as root_parallel sends them
+    records = [((first,), (0, 0, 1), 0) for first in white]
+    records += [((first, second), (0, 0, 1), 0) for first in white for second in black]
+    tree.merge_statistics(records)
+
+    nodes = list(walk(tree.root, loaded_only=True))
+    assert tree.node_count == len(nodes) <= 6
+    assert all(node.board is None for node, depth in nodes if depth % 2 != 0)
+
+
+if __name__ == '__main__':
+    test_collapse_keeps_shared_nodes()
+    test_node_count_matches_tree_with_transpositions()
+    test_merge_keeps_node_budget()
+    print("ok")
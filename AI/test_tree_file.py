@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mcts import mcts
+from tree_stats import walk
+import tree_file
+
+import io
+import random
+import shutil
+import contextlib
+
+
+def search(tree : mcts, iterations : int, seed : int):
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            tree.monte_carlo_tree_search()
+    tree.reset_current()
+
+def saved_nodes(file_name):
+    root, _ = tree_file.TreeFile(file_name).build_tree()
+    return sorted((depth, node.stats, node.zobrist_hash) for node, depth in walk(root))
+
+def test_lazy_saves_keep_subtrees_on_disk(tmp_path):
+    tree = mcts(autosave=False, use_transpositions=True)
+    search(tree, 60, seed=3)
+    tree_file.write_tree(tmp_path / 'start.tree', tree.root, use_transpositions=True, include_boards=True)
+
+    results = {}
+    for lazy in (False, True):
+        save_dir = tmp_path / ('lazy' if lazy else 'eager')
+        save_dir.mkdir()
+        shutil.copy(tmp_path / 'start.tree', save_dir / 'start.tree')
+
+        # every third iteration is a full save
+        tree = mcts(import_tree_file=save_dir / 'start.tree', lazy_load=lazy, max_hydrated=5 if lazy else None)
+        tree.compact_every = 3
+        search(tree, 9, seed=4)
+        results[lazy] = tree, saved_nodes(save_dir / 'mcts_tree.tree')
+
+    (eager, eager_nodes), (lazy, lazy_nodes) = results[False], results[True]
+    assert lazy_nodes == eager_nodes
+    assert lazy.root.stats == eager.root.stats
+    assert lazy.lazy_tree is not None
+    assert sum(1 for _ in walk(lazy.root, loaded_only=True)) < len(lazy_nodes) // 2
+
+def test_report_counts_records_on_disk(tmp_path):
+    tree = mcts(autosave=False, use_transpositions=True)
+    search(tree, 60, seed=3)
+    tree_file.write_tree(tmp_path / 'start.tree', tree.root, use_transpositions=True)
+    expected = tree.report()
+
+    lazy = mcts(import_tree_file=tmp_path / 'start.tree', lazy_load=True, autosave=False)
+    report = lazy.report()
+    for key in ('nodes', 'max_depth', 'nodes_per_depth', 'branching_factors', 'visit_counts', 'states'):
+        assert report[key] == expected[key]
+    assert report['disk_nodes'] == report['nodes'] - 1
+    assert lazy.root._children is None # nothing was read in
+
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-q'])
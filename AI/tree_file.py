@@ -0,0 +1,472 @@
+from chess_node import *
+from array_tree import encode_move, decode_move
+
+import os
+import struct
+import pickle
+import pathlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+#* file layout: header, node records, board section (optional), extra child links (transpositions)
+#* without the board section positions are replayed from the root board through the moves
+
+MAGIC = b'CHESSMCT'
+VERSION = 1
+
+# header flags
+FLAG_BOARDS = 1             # a 64-byte board follows for every node
+FLAG_TRANSPOSITIONS = 2     # the tree was searched with a transposition table
+FLAG_BITBOARD = 4           # the tree was searched with the bitboard generator
+
+# magic, version, flags, node count, link count, snapshot interval (0 for none), compact_every, root board, root side to move
+HEADER = struct.Struct('<8sHHQQII64sB7x')
+
+# nodes are written breadth first, so a parent always comes before its children and those children are contiguous
+NODE_DTYPE = np.dtype([
+    ('parent', '<i4'),
+    ('first_child', '<i4'),
+    ('child_count', '<u2'),
+    ('move', '<u2'),        # packed as in array_tree.encode_move (0 for the root)
+    ('state', 'i1'),
+    ('side', 'u1'),         # side to move at the node
+    ('white_wins', '<u4'),
+    ('black_wins', '<u4'),
+    ('draws', '<u4'),
+])
+
+# a child reached through a transposition, from a node other than the one it is stored under
+LINK_DTYPE = np.dtype([('parent', '<i4'), ('child', '<i4'), ('move', '<u2')])
+
+BOARD_SIZE = 64
+
+
+def is_tree_file(file_name):
+    with open(file_name, 'rb') as ifile:
+        return ifile.read(len(MAGIC)) == MAGIC
+
+def stored_children(entry, lazy_tree):
+    """ (packed move, child) pairs of a node being written. Children still on disk in lazy_tree's file are given as their
+    record index there (an int), unless a transposition already read them in under another parent.
+    """
+    if type(entry) is int:
+        node_index = entry
+    elif entry._children is not None or entry.tree_source is None or entry.tree_source[0] is not lazy_tree:
+        return [(encode_move(chessMove), child) for chessMove, child in entry.children.items()]
+    else:
+        node_index = entry.tree_source[1]
+
+    saved_tree = lazy_tree.saved_tree
+    children = [(int(saved_tree.nodes['move'][child_index]), child_index) for child_index in saved_tree.children(node_index)]
+    children += [(encode_move(chessMove), child_index) for child_index, chessMove in lazy_tree.links.get(node_index, [])]
+
+    linked_nodes = lazy_tree.linked_nodes
+    return [(move, linked_nodes[child_index] if linked_nodes.get(child_index) is not None else child_index) for move, child_index in children]
+
+def write_tree(file_name, root : ChessNode, snapshot_interval : int = None, compact_every : int = 1000, use_transpositions : bool = False, include_boards : bool = False,
+               lazy_tree = None):
+    """ Writes the tree under root breadth first, without recursion, returns the nodes in the order they were written
+
+    include_boards adds every node's board, so readers make nodes straight from it instead of replaying moves. Subtrees
+    a lazily loaded tree has not read in are copied record by record from lazy_tree's file (they are returned as their
+    record index there), so saving does not read them in.
+    """
+    order = [root]
+    index = {id(root): 0}
+    copied = {} # record index in lazy_tree's file -> index in this file
+    parents = [-1]
+    moves = [0]
+    sides = [root.move]
+    first_child = []
+    child_count = []
+    links = []
+
+    for node_index, node in enumerate(order):
+        first_child.append(len(order))
+        for move, child in stored_children(node, lazy_tree):
+            seen = copied if type(child) is int else index
+            key = child if type(child) is int else id(child)
+            if key in seen:
+                links.append((node_index, seen[key], move))
+                continue
+            seen[key] = len(order)
+            order.append(child)
+            parents.append(node_index)
+            moves.append(move)
+            sides.append(sides[node_index] ^ 1)
+        child_count.append(len(order) - first_child[-1])
+
+    saved_tree = lazy_tree.saved_tree if lazy_tree is not None else None
+    stats = [saved_tree.stats(node) if type(node) is int else node.stats for node in order]
+    states = [int(saved_tree.nodes['state'][node]) if type(node) is int else node.state_evaluation for node in order]
+
+    records = np.zeros(len(order), dtype=NODE_DTYPE)
+    records['parent'] = parents
+    records['first_child'] = first_child
+    records['child_count'] = child_count
+    records['move'] = moves
+    records['state'] = states
+    records['side'] = sides # from the parent, trees saved by older versions can have nodes with a stale side to move
+    stats = np.array(stats, dtype=np.uint32).reshape(-1, 3)
+    records['white_wins'], records['black_wins'], records['draws'] = stats[:, 0], stats[:, 1], stats[:, 2]
+
+    flags = 0
+    if include_boards:
+        flags |= FLAG_BOARDS
+    if use_transpositions:
+        flags |= FLAG_TRANSPOSITIONS
+    if root.bitboard is not None:
+        flags |= FLAG_BITBOARD
+
+    with open(file_name, 'wb') as ofile:
+        ofile.write(HEADER.pack(MAGIC, VERSION, flags, len(order), len(links), snapshot_interval or 0, compact_every, bytes(root.board), root.move))
+        ofile.write(records.tobytes())
+
+        if include_boards:
+            boards = np.zeros((len(order), BOARD_SIZE), dtype=np.uint8)
+            for node_index, node in enumerate(order):
+                if type(node) is not int:
+                    released = node.board is None
+                    if released:
+                        node.restore_position()
+                    boards[node_index] = np.frombuffer(bytes(node.board), dtype=np.uint8)
+                    if released:
+                        node.release_position()
+                elif saved_tree.boards is not None:
+                    boards[node_index] = saved_tree.boards[node]
+                else:
+                    # the parent's board (written before it) with the move played, no castling or en passant to handle
+                    chessMove = decode_move(moves[node_index])
+                    board = boards[node_index]
+                    board[:] = boards[parents[node_index]]
+                    board[chessMove[1]] = chessMove[2] if len(chessMove) == 3 else board[chessMove[0]]
+                    board[chessMove[0]] = PieceType.E.value
+            ofile.write(boards.tobytes())
+
+        ofile.write(np.array(links, dtype=LINK_DTYPE).tobytes())
+        ofile.flush()
+        os.fsync(ofile.fileno())
+
+    return order
+
+
+class TreeFile():
+    """ Read-only view of a tree file, node records (and boards) are memory-mapped and only paged in when touched
+    """
+
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as ifile:
+            header = HEADER.unpack(ifile.read(HEADER.size))
+
+        magic, version, self.flags, self.node_count, self.link_count, snapshot_interval, self.compact_every, root_board, self.root_side = header
+        if magic != MAGIC:
+            raise Exception("{} is not a tree file.".format(file_name))
+        if version != VERSION:
+            raise Exception("Tree file version {} is not supported (expected {}).".format(version, VERSION))
+
+        self.snapshot_interval = snapshot_interval if snapshot_interval != 0 else None
+        self.root_board = bytearray(root_board)
+
+        offset = HEADER.size
+        self.nodes = np.memmap(file_name, dtype=NODE_DTYPE, mode='r', offset=offset, shape=(self.node_count,))
+        offset += self.node_count * NODE_DTYPE.itemsize
+
+        self.boards = None
+        if self.flags & FLAG_BOARDS:
+            self.boards = np.memmap(file_name, dtype=np.uint8, mode='r', offset=offset, shape=(self.node_count, BOARD_SIZE))
+            offset += self.node_count * BOARD_SIZE
+
+        self.links = np.zeros(0, dtype=LINK_DTYPE)
+        if self.link_count > 0:
+            self.links = np.memmap(file_name, dtype=LINK_DTYPE, mode='r', offset=offset, shape=(self.link_count,))
+
+    def children(self, node_index : int):
+        """ Indices of the children stored under a node (transposition links not included)
+        """
+        first = int(self.nodes['first_child'][node_index])
+        return range(first, first + int(self.nodes['child_count'][node_index]))
+
+    def stats(self, node_index : int):
+        record = self.nodes[node_index]
+        return (int(record['white_wins']), int(record['black_wins']), int(record['draws']))
+
+    def get_move(self, node_index : int):
+        return decode_move(self.nodes['move'][node_index])
+
+    def make_node(self, parent : ChessNode, parent_index : int, chessMove : tuple, node_index : int, use_bitboard : bool):
+        """ Orphan child of parent (the node at parent_index) made from its stored board, the parent's position is not needed
+        """
+        # moves only count as progress (resetting the 50 move counter) when they take a piece or promote
+        progress = len(chessMove) == 3 or self.boards[parent_index][chessMove[1]] != PieceType.E.value
+        return ChessNode(import_board=self.boards[node_index].tobytes(), last_move=chessMove, last_progress=0 if progress else parent.last_progress + 1,
+                         use_bitboard=use_bitboard, side_to_move=parent.move ^ 1)
+
+    def build_tree(self, use_bitboard : bool = None):
+        """ Rebuilds the ChessNode tree, returns the root and, if the tree used one, its transposition table
+        """
+        if use_bitboard is None:
+            use_bitboard = bool(self.flags & FLAG_BITBOARD)
+
+        root = ChessNode(import_board=self.root_board, use_bitboard=use_bitboard, side_to_move=self.root_side)
+
+        parents = self.nodes['parent'].tolist()
+        moves = self.nodes['move'].tolist()
+        depths = [0] * self.node_count
+        nodes = [root]
+
+        # parents come first, so each node is made from a parent that already exists. Children are made as orphans
+        # and linked here, so draws are not counted up the tree again
+        for node_index in range(1, self.node_count):
+            parent_index = parents[node_index]
+            depths[node_index] = depths[parent_index] + 1
+
+            parent = nodes[parent_index]
+            chessMove = decode_move(moves[node_index])
+            if self.boards is not None:
+                child = self.make_node(parent, parent_index, chessMove, node_index, use_bitboard)
+            else:
+                child = parent.create_child(chessMove, make_orphan=True)
+            parent.add_child(chessMove, child)
+            child.parent = parent
+            nodes.append(child)
+
+        columns = zip(self.nodes['white_wins'].tolist(), self.nodes['black_wins'].tolist(), self.nodes['draws'].tolist(), self.nodes['state'].tolist())
+        for node, (white_wins, black_wins, draws, state) in zip(nodes, columns):
+            node.white_wins, node.black_wins, node.draws = white_wins, black_wins, draws
+            node.state_evaluation = state
+
+        for link in self.links:
+            nodes[int(link['parent'])].add_child(decode_move(link['move']), nodes[int(link['child'])])
+
+        transpositions = None
+        if self.flags & FLAG_TRANSPOSITIONS:
+            transpositions = {(node.zobrist_hash, depth): node for node, depth in zip(nodes, depths)}
+
+        # positions were needed to make the children, drop the ones a board-less tree would not keep
+        if self.snapshot_interval is not None:
+            for node, depth in zip(nodes, depths):
+                if depth % self.snapshot_interval != 0:
+                    node.release_position()
+
+        return root, transpositions
+
+
+class LazyTree():
+    """ Builds nodes from a TreeFile only when the search first descends into them
+
+    A node whose children are still on disk keeps (loader, record index) in its tree_source slot, and reading its
+    children reads them in. At most max_hydrated nodes keep their children read in, the least recently used ones that
+    are unchanged since loading let them go again (they are read back in on the next descent).
+    """
+
+    def __init__(self, saved_tree : TreeFile, max_hydrated : int = None, transpositions : dict = None):
+        self.saved_tree = saved_tree
+        self.max_hydrated = max_hydrated
+        self.transpositions = transpositions
+        self.hydrated = OrderedDict() # id(node) -> node, least recently used first
+
+        # transposition links by parent, and the nodes they point to (those are shared, so they are never let go)
+        self.links = {}
+        for parent_index, child_index, move in self.saved_tree.links.tolist():
+            self.links.setdefault(parent_index, []).append((child_index, decode_move(move)))
+        self.linked_nodes = {child_index: None for child_index in self.saved_tree.links['child'].tolist()}
+
+    def root_node(self, use_bitboard : bool = None):
+        if use_bitboard is None:
+            use_bitboard = bool(self.saved_tree.flags & FLAG_BITBOARD)
+        self.use_bitboard = use_bitboard
+
+        root = ChessNode(import_board=self.saved_tree.root_board, use_bitboard=use_bitboard, side_to_move=self.saved_tree.root_side)
+        self.set_record(root, 0)
+
+        if self.transpositions is not None:
+            self.transpositions[(root.zobrist_hash, 0)] = root
+        return root
+
+    def set_record(self, node : ChessNode, node_index : int):
+        record = self.saved_tree.nodes[node_index]
+        node.white_wins, node.black_wins, node.draws = int(record['white_wins']), int(record['black_wins']), int(record['draws'])
+        node.state_evaluation = int(record['state'])
+
+        if record['child_count'] > 0 or node_index in self.links:
+            node.tree_source = (self, node_index)
+
+    def make_child(self, node : ChessNode, chessMove : tuple, node_index : int, depth : int):
+        if node_index in self.linked_nodes and self.linked_nodes[node_index] is not None:
+            return self.linked_nodes[node_index]
+
+        # an orphan, so a draw is not counted up the tree again. With stored boards a board-less node's position is
+        # not rebuilt just to make its children
+        if self.saved_tree.boards is not None:
+            child = self.saved_tree.make_node(node, node.tree_source[1], chessMove, node_index, self.use_bitboard)
+        else:
+            child = node.create_child(chessMove, make_orphan=True)
+        child.parent = node
+        self.set_record(child, node_index)
+
+        if node_index in self.linked_nodes:
+            self.linked_nodes[node_index] = child
+        if self.transpositions is not None:
+            self.transpositions[(child.zobrist_hash, depth)] = child
+        if self.saved_tree.snapshot_interval is not None and depth % self.saved_tree.snapshot_interval != 0:
+            child.release_position()
+        return child
+
+    def hydrate(self, node : ChessNode):
+        """ Reads in the children of a node whose children are still on disk
+        """
+        node_index = node.tree_source[1]
+
+        depth = self.depth(node) + 1
+
+        node._children = {}
+        for child_index in self.saved_tree.children(node_index):
+            chessMove = self.saved_tree.get_move(child_index)
+            node._children[chessMove] = self.make_child(node, chessMove, child_index, depth)
+        for child_index, chessMove in self.links.get(node_index, []):
+            node._children[chessMove] = self.make_child(node, chessMove, child_index, depth)
+
+        self.hydrated[id(node)] = node
+        self.evict()
+
+    def depth(self, node : ChessNode):
+        depth = 0
+        while node.parent is not None:
+            depth += 1
+            node = node.parent
+        return depth
+
+    def touch(self, node : ChessNode):
+        """ Marks a node as just used, so it is the last to let go of its children
+        """
+        if id(node) in self.hydrated:
+            self.hydrated.move_to_end(id(node))
+
+    def is_clean(self, node : ChessNode):
+        """ True if the node and its children are as they were read in, and none of the children have their own children read in
+        """
+        node_index = node.tree_source[1]
+        child_indices = list(self.saved_tree.children(node_index)) + [child_index for child_index, _ in self.links.get(node_index, [])]
+        if len(node._children) != len(child_indices):
+            return False
+
+        for child, child_index in zip([node] + list(node._children.values()), [node_index] + child_indices):
+            if child is not node and (id(child) in self.hydrated or child._children is not None and child.tree_source is None):
+                return False
+            if child.stats != self.saved_tree.stats(child_index) or child.state_evaluation != int(self.saved_tree.nodes['state'][child_index]):
+                return False
+        return True
+
+    def evict(self):
+        if self.max_hydrated is None or len(self.hydrated) <= self.max_hydrated:
+            return
+
+        # nodes on the current path have a child with its children read in, so they are never clean. The node read in
+        # last is the one being descended into
+        for key, node in list(self.hydrated.items())[:-1]:
+            if len(self.hydrated) <= self.max_hydrated:
+                break
+            if not self.is_clean(node):
+                continue
+
+            if self.transpositions is not None:
+                depth = self.depth(node) + 1
+                for child in node._children.values():
+                    if child.tree_source is not None and child.tree_source[1] in self.linked_nodes:
+                        continue
+                    if self.transpositions.get((child.zobrist_hash, depth)) is child:
+                        del self.transpositions[(child.zobrist_hash, depth)]
+
+            node._children = None
+            del self.hydrated[key]
+
+    def reopen(self, file_name, order : list):
+        """ A LazyTree over the file just written from this one's tree (order as write_tree returned it)
+
+        The nodes in memory carry over, their children now read from the new file, and the ones still on disk stay there.
+        """
+        saved_tree = TreeFile(file_name)
+        lazy_tree = LazyTree(saved_tree, max_hydrated=self.max_hydrated, transpositions=self.transpositions)
+        lazy_tree.use_bitboard = self.use_bitboard
+
+        hydrated = []
+        for node_index, node in enumerate(order):
+            if type(node) is int:
+                continue
+
+            node.tree_source = None
+            if saved_tree.nodes['child_count'][node_index] > 0 or node_index in lazy_tree.links:
+                node.tree_source = (lazy_tree, node_index)
+                if node._children is not None:
+                    hydrated.append(node)
+            if node_index in lazy_tree.linked_nodes:
+                lazy_tree.linked_nodes[node_index] = node
+
+        # least recently used first as before, then the nodes the search has given children since
+        ranks = {key: rank for rank, key in enumerate(self.hydrated)}
+        hydrated.sort(key=lambda node: ranks.get(id(node), len(ranks)))
+        for node in hydrated:
+            lazy_tree.hydrated[id(node)] = node
+
+        self.hydrated.clear()
+        self.saved_tree = None
+        lazy_tree.evict()
+        return lazy_tree
+
+    def close(self, root : ChessNode):
+        """ Reads in every node still on disk and lets go of the file (needed before the file can be replaced)
+        """
+        self.max_hydrated = None
+
+        nodes = [root]
+        seen = {id(root)}
+        while len(nodes) > 0:
+            node = nodes.pop()
+            for child in node.children.values():
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    nodes.append(child)
+            node.tree_source = None
+
+        self.hydrated.clear()
+        self.saved_tree = None
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    """ Loads trees pickled by earlier versions: run as a script (class in __main__) and saved on Windows
+    """
+
+    def find_class(self, module, name):
+        if module == '__main__' and name == 'mcts':
+            from mcts import mcts # mcts imports this module
+            return mcts
+        if module == 'pathlib' and name == 'WindowsPath':
+            return pathlib.PureWindowsPath
+        return super().find_class(module, name)
+
+def convert_pickle(pickle_file, tree_file, include_boards : bool = False):
+    """ Converts a pickled mcts tree into the binary tree format
+    """
+    with open(pickle_file, 'rb') as ifile:
+        tree = LegacyUnpickler(ifile).load()
+
+    write_tree(tree_file, tree.root, snapshot_interval=getattr(tree, 'snapshot_interval', None), compact_every=getattr(tree, 'compact_every', 1000),
+               use_transpositions=getattr(tree, 'transpositions', None) is not None, include_boards=include_boards)
+    return tree
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python tree_file.py model/mcts_tree.obj model/mcts_tree.tree [--boards]
+    if len(sys.argv) < 3:
+        print("usage: python tree_file.py <pickle file> <tree file> [--boards]")
+        quit()
+
+    convert_pickle(sys.argv[1], sys.argv[2], include_boards='--boards' in sys.argv)
+
+    tree_file = TreeFile(sys.argv[2])
+    print("Nodes:", tree_file.node_count)
+    print("Root states:", tree_file.stats(0))
@@ -0,0 +1,215 @@
+from chess_node import *
+
+import sys
+
+import numpy as np
+
+
+# memory components reported by node_bytes
+COMPONENTS = ('nodes', 'stats', 'children', 'boards', 'moves', 'hashes', 'move_caches')
+
+
+def walk(root : ChessNode, loaded_only : bool = False, shared_nodes : bool = True):
+    """ Yields (node, depth) for every node under root, depth first with an explicit stack (no recursion limit)
+
+    loaded_only skips children that are still on disk in a lazily loaded tree instead of reading them in (without it they
+    are read in and kept, up to the tree's max_hydrated). shared_nodes remembers visited nodes so transpositions are
+    reported once, without it each path counts.
+    """
+    stack = [(root, 0)]
+    seen = {id(root)} if shared_nodes else None
+
+    while len(stack) > 0:
+        node, depth = stack.pop()
+        children = node._children if loaded_only else node.children # read in before the node is yielded
+        yield node, depth
+
+        if children is None:
+            continue
+
+        for child in children.values():
+            if seen is not None:
+                if id(child) in seen:
+                    continue
+                seen.add(id(child))
+            stack.append((child, depth + 1))
+
+def node_bytes(node : ChessNode):
+    """ Estimated bytes held by one node, by component (see COMPONENTS)
+    """
+    size = sys.getsizeof
+    result = dict.fromkeys(COMPONENTS, 0)
+
+    result['nodes'] = size(node)
+    result['stats'] = size(node.white_wins) + size(node.black_wins) + size(node.draws)
+    result['hashes'] = size(node.zobrist_hash)
+
+    if node._children is not None:
+        result['children'] = size(node._children)
+    if node.last_move is not None:
+        result['moves'] = size(node.last_move)
+    if node.board is not None:
+        result['boards'] = size(node.board) + size(node.piece_squares) + size(node.piece_squares[0]) + size(node.piece_squares[1]) + size(node.king_squares)
+    if node.bitboard is not None:
+        result['boards'] += size(node.bitboard) + size(node.bitboard.pieces) + size(node.bitboard.colors)
+    if node.legal_moves_cache is not None:
+        result['move_caches'] = size(node.legal_moves_cache) + sum(size(move) for move in node.legal_moves_cache)
+
+    return result
+
+def log_bucket(value : int):
+    """ Histogram bucket of a count: 0, 1, 2-3, 4-7, ... named by its lowest value
+    """
+    return 0 if value <= 0 else 1 << (value.bit_length() - 1)
+
+def ranges(starts, counts):
+    """ Concatenation of range(start, start + count) for each start and count (numpy arrays)
+    """
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(ends[-1] if len(ends) > 0 else 0)
+
+def add_counts(histogram : dict, values):
+    for value, count in zip(*np.unique(values, return_counts=True)):
+        histogram[int(value)] = histogram.get(int(value), 0) + int(count)
+
+def add_file_records(report : dict, lazy_tree, node_indices : list, depths : list, counted : set, shared_nodes : bool = True):
+    """ Adds the subtrees still on disk below the given records of lazy_tree's file to a tree_report, a level at a time
+    from the records, without making nodes
+
+    counted holds the ids of nodes the report already has, nodes linked in through a transposition and read in are
+    not counted again (with shared_nodes).
+    """
+    saved_tree = lazy_tree.saved_tree
+    records = saved_tree.nodes
+    states = {state.value: state.name for state in StateEvaluation}
+
+    # transposition links sorted by parent, so each record's links are a range
+    links = saved_tree.links
+    link_order = np.argsort(links['parent'], kind='stable')
+    link_parents, link_children = links['parent'][link_order], links['child'][link_order]
+
+    skipped = np.zeros(0, dtype=np.int64)
+    if shared_nodes:
+        skipped = np.array([node_index for node_index, node in lazy_tree.linked_nodes.items() if node is not None and id(node) in counted], dtype=np.int64)
+
+    frontier = np.array(node_indices, dtype=np.int64)
+    depths = np.array(depths, dtype=np.int64)
+    while len(frontier) > 0:
+        counts = records['child_count'][frontier].astype(np.int64)
+        link_starts = np.searchsorted(link_parents, frontier, side='left')
+        link_counts = np.searchsorted(link_parents, frontier, side='right') - link_starts
+        add_counts(report['branching_factors'], counts + link_counts)
+
+        children = ranges(records['first_child'][frontier].astype(np.int64), counts)
+        child_depths = np.repeat(depths + 1, counts)
+        if not shared_nodes:
+            # each path counts, so subtrees reached through a link are counted again
+            children = np.concatenate([children, link_children[ranges(link_starts, link_counts)].astype(np.int64)])
+            child_depths = np.concatenate([child_depths, np.repeat(depths + 1, link_counts)])
+        if len(skipped) > 0:
+            keep = ~np.isin(children, skipped)
+            children, child_depths = children[keep], child_depths[keep]
+
+        if len(children) > 0:
+            report['nodes'] += len(children)
+            report['disk_nodes'] += len(children)
+            report['max_depth'] = max(report['max_depth'], int(child_depths.max()))
+            add_counts(report['nodes_per_depth'], child_depths)
+
+            child_records = records[children]
+            visits = child_records['white_wins'].astype(np.int64) + child_records['black_wins'] + child_records['draws']
+            for visit_count, count in zip(*np.unique(visits, return_counts=True)):
+                bucket = log_bucket(int(visit_count))
+                report['visit_counts'][bucket] = report['visit_counts'].get(bucket, 0) + int(count)
+            for state, count in zip(*np.unique(child_records['state'], return_counts=True)):
+                report['states'][states[int(state)]] += int(count)
+
+        frontier, depths = children, child_depths
+
+def tree_report(root : ChessNode, loaded_only : bool = False, shared_nodes : bool = True):
+    """ Shape and memory statistics of the tree under root, gathered in one streaming pass
+
+    Branching factors count children in the tree (not legal moves), visits are bucketed by powers of two. Subtrees a
+    lazily loaded tree has not read in are counted from its file (without loaded_only), memory only counts nodes in memory.
+    """
+    report = {
+        'nodes': 0,
+        'max_depth': 0,
+        'nodes_per_depth': {},
+        'branching_factors': {},
+        'visit_counts': {},
+        'states': {state.name: 0 for state in StateEvaluation},
+        'unloaded_nodes': 0,
+        'disk_nodes': 0,
+        'bytes': dict.fromkeys(COMPONENTS, 0),
+    }
+    states = {state.value: state.name for state in StateEvaluation}
+    nodes_per_depth = report['nodes_per_depth']
+    branching_factors = report['branching_factors']
+    visit_counts = report['visit_counts']
+    memory = report['bytes']
+
+    counted = set()
+    on_disk = {} # lazy tree -> (record indices, depths) of the nodes whose children are still on its file
+
+    for node, depth in walk(root, loaded_only=True, shared_nodes=shared_nodes):
+        report['nodes'] += 1
+        report['max_depth'] = max(report['max_depth'], depth)
+        nodes_per_depth[depth] = nodes_per_depth.get(depth, 0) + 1
+        if shared_nodes:
+            counted.add(id(node))
+
+        if node._children is None and node.tree_source is not None:
+            if loaded_only:
+                report['unloaded_nodes'] += 1 # its children are not counted
+            else:
+                node_indices, depths = on_disk.setdefault(node.tree_source[0], ([], []))
+                node_indices.append(node.tree_source[1])
+                depths.append(depth)
+        else:
+            branching = len(node._children) if node._children is not None else 0
+            branching_factors[branching] = branching_factors.get(branching, 0) + 1
+
+        bucket = log_bucket(sum(node.stats))
+        visit_counts[bucket] = visit_counts.get(bucket, 0) + 1
+        report['states'][states[node.state_evaluation]] += 1
+
+        for component, component_bytes in node_bytes(node).items():
+            memory[component] += component_bytes
+
+    for lazy_tree, (node_indices, depths) in on_disk.items():
+        add_file_records(report, lazy_tree, node_indices, depths, counted, shared_nodes=shared_nodes)
+
+    report['total_bytes'] = sum(memory.values())
+    report['bytes_per_node'] = report['total_bytes'] / (report['nodes'] - report['disk_nodes'])
+    return report
+
+def print_report(report : dict):
+    print("Nodes:             {} (max depth {})".format(report['nodes'], report['max_depth']))
+    if report['unloaded_nodes'] > 0:
+        print("Not loaded:        {} nodes with children on disk".format(report['unloaded_nodes']))
+    if report['disk_nodes'] > 0:
+        print("On disk:           {} nodes, counted from the tree file".format(report['disk_nodes']))
+    print("Terminal states:   {}".format(', '.join('{} {}'.format(name, count) for name, count in report['states'].items() if name != StateEvaluation.PLAY.name)))
+    print("Memory:            {:.1f} MB ({:.0f} bytes/node)".format(report['total_bytes'] / 2**20, report['bytes_per_node']))
+    for component, component_bytes in report['bytes'].items():
+        print("    {:<12} {:>12} bytes  {:>5.1f}%".format(component, component_bytes, component_bytes / report['total_bytes'] * 100))
+
+    print("Nodes per depth:")
+    for depth, count in sorted(report['nodes_per_depth'].items()):
+        print("    {:>4}  {}".format(depth, count))
+    print("Branching factors:")
+    for branching, count in sorted(report['branching_factors'].items()):
+        print("    {:>4}  {}".format(branching, count))
+    print("Visit counts:")
+    for bucket, count in sorted(report['visit_counts'].items()):
+        print("    {:>12}  {}".format('{}-{}'.format(bucket, 2 * bucket - 1) if bucket > 1 else bucket, count))
+
+
+if __name__ == '__main__':
+    from mcts import mcts, default_save_dir, default_tree_name
+
+    # python tree_stats.py [tree file] [--loaded-only]
+    path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith('--') else default_save_dir.joinpath(default_tree_name)
+    tree = mcts(import_tree_file=path, lazy_load=True)
+    print_report(tree.report(loaded_only='--loaded-only' in sys.argv))
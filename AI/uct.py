@@ -0,0 +1,20 @@
+import math
+
+import numpy as np
+
+
+# exploration constant of the UCB1 formula
+EXPLORATION = math.sqrt(2)
+
+
+def uct_scores(wins, draws, visits, parent_visits : int):
+    """ UCB1 score of every child at once, draws count as half a win
+    """
+    visits = np.asarray(visits, dtype=np.float64)
+    win_rate = (np.asarray(wins, dtype=np.float64) + np.asarray(draws, dtype=np.float64) * 0.5) / visits
+    return win_rate + EXPLORATION * np.sqrt(math.log(parent_visits) / visits)
+
+def uct_select(wins, draws, visits, parent_visits : int):
+    """ Index of the child with the best UCB1 score, the first one wins a tie
+    """
+    return int(np.argmax(uct_scores(wins, draws, visits, parent_visits)))
@@ -0,0 +1,20 @@
+import random
+
+
+# keys come from a fixed seed so a position hashes the same in every run and in saved trees
+_key_generator = random.Random(434)
+
+# PIECE_KEYS[piece][square], indexed by PieceType value (empty squares hash to 0)
+PIECE_KEYS = tuple(tuple(0 if piece == 0 else _key_generator.getrandbits(64) for _ in range(64)) for piece in range(13))
+
+# toggled in whenever black is to move
+BLACK_TO_MOVE = _key_generator.getrandbits(64)
+
+
+def hash_position(board : list, move : int):
+    """ Full 64-bit Zobrist hash of a board, ChessNode keeps it updated incrementally from here on
+    """
+    zobrist_hash = BLACK_TO_MOVE if move == 1 else 0
+    for square, piece in enumerate(board):
+        zobrist_hash ^= PIECE_KEYS[piece][square]
+    return zobrist_hash